@@ -1,12 +1,53 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from src.app.config import settings
 from src.app.api.v1 import include_routers
+from src.app.utils.sync import TreeSyncWorker
+from src.app.utils.http import init_http_clients, close_http_clients
+from src.app.utils.cache import LocalCacheInvalidator, ViewCounterFlusher
+from src.app.utils.prewarm import prewarm_on_startup
+from src.app.utils.tree_index import TreeIndexUpdater
+from src.app.utils.stream import tree_event_hub
+from src.app.utils.auth import hash_pool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_http_clients()
+    cache_invalidator = LocalCacheInvalidator()
+    await cache_invalidator.start()
+    tree_sync = TreeSyncWorker(concurrency=settings.TREE_SYNC_WORKERS)
+    await tree_sync.start()
+    await tree_event_hub.start()
+    view_flusher = ViewCounterFlusher()
+    await view_flusher.start()
+    # Прогрев не задерживает старт — идёт в фоне
+    prewarm = asyncio.create_task(prewarm_on_startup()) if settings.PREWARM_ON_STARTUP else None
+    tree_index = None
+    if settings.TREE_INDEX_ENABLED:
+        tree_index = TreeIndexUpdater(snapshot_path=settings.TREE_INDEX_SNAPSHOT or None)
+        await tree_index.start()
+    yield
+    if tree_index:
+        await tree_index.stop()
+    if prewarm:
+        prewarm.cancel()
+        await asyncio.gather(prewarm, return_exceptions=True)
+    await view_flusher.stop()
+    await tree_event_hub.stop()
+    await tree_sync.stop()
+    await cache_invalidator.stop()
+    await close_http_clients()
+    hash_pool.shutdown()
 
 
 app = FastAPI(
     version=settings.APP_VERSION,
     title="Atatek API",
     description="New version on Atatek API using FastAPI",
+    lifespan=lifespan,
 )
 
 
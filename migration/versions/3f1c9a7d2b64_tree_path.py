@@ -0,0 +1,53 @@
+"""tree path
+
+Revision ID: 3f1c9a7d2b64
+Revises: 0a97ee2ae4c4
+Create Date: 2026-10-18 10:12:04.318220
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c9a7d2b64'
+down_revision: Union[str, Sequence[str], None] = '0a97ee2ae4c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tree', sa.Column('path', postgresql.ARRAY(sa.Integer()), server_default='{}', nullable=False))
+    op.add_column('tree', sa.Column('depth', sa.Integer(), server_default='0', nullable=False))
+
+    # Заполняем path/depth для существующих узлов одним проходом от корней
+    op.execute(
+        """
+        WITH RECURSIVE walk AS (
+            SELECT id, ARRAY[]::integer[] AS path
+            FROM tree
+            WHERE parent_id IS NULL
+            UNION ALL
+            SELECT t.id, w.path || w.id
+            FROM tree t
+            JOIN walk w ON t.parent_id = w.id
+        )
+        UPDATE tree
+        SET path = walk.path, depth = cardinality(walk.path)
+        FROM walk
+        WHERE tree.id = walk.id
+        """
+    )
+
+    op.create_index('ix_tree_path', 'tree', ['path'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tree_path', table_name='tree', postgresql_using='gin')
+    op.drop_column('tree', 'depth')
+    op.drop_column('tree', 'path')
@@ -0,0 +1,48 @@
+"""tree descendant_count
+
+Revision ID: 5d0c7e2b9a14
+Revises: e4a9b3f08d17
+Create Date: 2026-10-18 16:05:12.418230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d0c7e2b9a14'
+down_revision: Union[str, Sequence[str], None] = 'e4a9b3f08d17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tree', sa.Column('descendant_count', sa.Integer(), server_default='0', nullable=False))
+    # Заполняем снизу вверх: по одному UPDATE на поколение.
+    # Потомки удалённых узлов в счётчики предков выше не попадают.
+    bind = op.get_bind()
+    max_depth = bind.execute(sa.text("SELECT coalesce(max(depth), 0) FROM tree")).scalar()
+    for depth in range(max_depth - 1, -1, -1):
+        bind.execute(
+            sa.text(
+                """
+                UPDATE tree SET descendant_count = sub.total
+                FROM (
+                    SELECT parent_id, SUM(1 + descendant_count) AS total
+                    FROM tree
+                    WHERE depth = :child_depth AND is_deleted IS NOT TRUE
+                    GROUP BY parent_id
+                ) sub
+                WHERE tree.id = sub.parent_id
+                """
+            ),
+            {"child_depth": depth + 1},
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('tree', 'descendant_count')
@@ -0,0 +1,38 @@
+"""tree name trgm
+
+Revision ID: 8c2e5d41a9f3
+Revises: 3f1c9a7d2b64
+Create Date: 2026-10-18 11:40:27.905113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c2e5d41a9f3'
+down_revision: Union[str, Sequence[str], None] = '3f1c9a7d2b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.add_column('tree', sa.Column('name_normalized', sa.String(), sa.Computed('lower(name)', persisted=True), nullable=True))
+    op.create_index(
+        'ix_tree_name_normalized_trgm',
+        'tree',
+        ['name_normalized'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'name_normalized': 'gin_trgm_ops'},
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tree_name_normalized_trgm', table_name='tree', postgresql_using='gin')
+    op.drop_column('tree', 'name_normalized')
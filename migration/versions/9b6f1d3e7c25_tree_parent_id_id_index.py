@@ -0,0 +1,28 @@
+"""tree parent_id id index
+
+Revision ID: 9b6f1d3e7c25
+Revises: 5d0c7e2b9a14
+Create Date: 2026-10-18 16:48:03.902117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b6f1d3e7c25'
+down_revision: Union[str, Sequence[str], None] = '5d0c7e2b9a14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_tree_parent_id_id', 'tree', ['parent_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tree_parent_id_id', table_name='tree')
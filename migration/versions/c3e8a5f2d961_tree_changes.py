@@ -0,0 +1,37 @@
+"""tree changes
+
+Revision ID: c3e8a5f2d961
+Revises: 9b6f1d3e7c25
+Create Date: 2026-10-18 17:31:44.256903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e8a5f2d961'
+down_revision: Union[str, Sequence[str], None] = '9b6f1d3e7c25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('tree_changes',
+    sa.Column('version', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('node_id', sa.Integer(), nullable=False),
+    sa.Column('parent_id', sa.Integer(), nullable=True),
+    sa.Column('op', sa.String(length=16), nullable=False),
+    sa.Column('data', sa.JSON(), nullable=True),
+    sa.Column('tx_id', sa.BigInteger(), server_default=sa.text('(pg_current_xact_id()::text)::bigint'), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('version')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('tree_changes')
@@ -0,0 +1,45 @@
+"""tree t_id unique
+
+Revision ID: e4a9b3f08d17
+Revises: b71d04e6c3a2
+Create Date: 2026-10-18 14:22:36.770914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a9b3f08d17'
+down_revision: Union[str, Sequence[str], None] = 'b71d04e6c3a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Дубликаты, появившиеся из-за гонки параллельных синхронизаций:
+    # оставляем t_id у самой ранней записи, у остальных обнуляем.
+    # Сами строки не удаляем — на них уже могут ссылаться дети и страницы.
+    op.execute(
+        """
+        UPDATE tree
+        SET t_id = NULL
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (PARTITION BY t_id ORDER BY id) AS rn
+                FROM tree
+                WHERE t_id IS NOT NULL
+            ) dup
+            WHERE dup.rn > 1
+        )
+        """
+    )
+    op.create_index(op.f('ix_tree_t_id'), 'tree', ['t_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_tree_t_id'), table_name='tree')
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, Response
+from fastapi import APIRouter, Depends, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.app.config import auth
 from src.app.db import get_db
@@ -10,9 +10,9 @@ router = APIRouter(prefix="/auth", tags=['Auth'])
 
 @router.post("/signup")
 @standar_atatek
-async def create_user(payload:CreateUser, response: Response, db: AsyncSession = Depends(get_db)):
+async def create_user(payload:CreateUser, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
     service = AuthService(db)
-    user = await service.create_user(payload=payload)
+    user = await service.create_user(payload=payload, client_ip=request.client.host if request.client else None)
     access_token, refresh_token, csrf_token = auth.create_tokens(
         user.id,
     )
@@ -44,9 +44,9 @@ async def resend_verify_code(user_data = Depends(auth.get_user_data_dependency()
 
 @router.post('/login')
 @standar_atatek
-async def login_user(payload: LoginUser, response: Response, db: AsyncSession = Depends(get_db)):
+async def login_user(payload: LoginUser, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
     service = AuthService(db)
-    login = await service.login_user(payload)
+    login = await service.login_user(payload, client_ip=request.client.host if request.client else None)
     access_token, refresh_token, csrf_token = auth.create_tokens(
         login.id,
     )
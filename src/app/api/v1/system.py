@@ -4,6 +4,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from src.app.db import get_db
 from src.app.schemas.system import RoleCreate, RoleResponse, RolesList
 from src.app.core.system import SystemService
+from src.app.utils.auth import hash_pool
+from src.app.utils.cache import RateLimiter
+from src.app.utils.http import get_http_stats
+from src.app.utils.stream import tree_event_hub
 
 router = APIRouter(prefix="/system", tags=["System"])
 
@@ -15,6 +19,18 @@ async def create_role(
     service = SystemService(db)
     return await service.create_role(payload)
 
+@router.get("/metrics/upstreams")
+async def upstream_metrics():
+    return get_http_stats()
+
+@router.get("/metrics/streams")
+async def stream_metrics():
+    return tree_event_hub.stats()
+
+@router.get("/metrics/auth")
+async def auth_metrics():
+    return {"password_hash": hash_pool.stats(), "rate_limits": RateLimiter.stats()}
+
 @router.get("/{role_id}", response_model=RoleResponse)
 async def get_role(role_id: int, db: AsyncSession = Depends(get_db)):
     service = SystemService(db)
@@ -1,20 +1,80 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Header, HTTPException, status
 from fastapi.params import Depends
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 
-from src.app.db import get_db
+from src.app.db import get_db, async_session_factory
 from src.app.config.auth import auth
-from src.app.core import TreeService
+from src.app.core import TreeService, TreeExportService
+from src.app.utils.stream import sse_events
 from src.app.utils import standar_atatek
 
 router = APIRouter(prefix="/tree", tags=["National tree"])
 
 @router.get('/')
 @standar_atatek
-async def get_tree(node_id: int, user_data = Depends(auth.get_user_data_dependency()), db: AsyncSession = Depends(get_db)):
+async def get_tree(
+    node_id: int,
+    limit: int | None = None,
+    after_id: int | None = None,
+    user_data = Depends(auth.get_user_data_dependency()),
+    db: AsyncSession = Depends(get_db)
+):
     service = TreeService(db)
-    return await service.get_tree_on_db(int(node_id), int(user_data["sub"]))
+    return await service.get_tree_on_db(int(node_id), int(user_data["sub"]), limit=limit, after_id=after_id)
+
+
+@router.get('/subtree')
+@standar_atatek
+async def get_subtree(node_id: int, depth: int = 3, user_data = Depends(auth.get_user_data_dependency()), db: AsyncSession = Depends(get_db)):
+    service = TreeService(db)
+    return await service.get_subtree(node_id=node_id, depth=depth)
+
+
+@router.get('/relation')
+@standar_atatek
+async def get_relation(a: int, b: int, user_data = Depends(auth.get_current_user_dependency()), db: AsyncSession = Depends(get_db)):
+    service = TreeService(db)
+    return await service.get_relation(a=a, b=b)
+
+
+@router.get('/nodes')
+@standar_atatek
+async def get_nodes_data(ids: str, user_data = Depends(auth.get_current_user_dependency()), db: AsyncSession = Depends(get_db)):
+    try:
+        node_ids = [int(node_id) for node_id in ids.split(",") if node_id.strip()]
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ids қате")
+    service = TreeService(db)
+    return await service.get_tree_nodes(node_ids)
+
+
+@router.get('/changes')
+@standar_atatek
+async def get_changes(since: int = 0, limit: int = 500, user_data = Depends(auth.get_user_data_dependency()), db: AsyncSession = Depends(get_db)):
+    service = TreeService(db)
+    return await service.get_changes(since=since, limit=limit)
+
+
+@router.get('/stream')
+async def stream_tree(
+    node_id: int | None = None,
+    page_id: int | None = None,
+    last_event_id: str | None = Header(None),
+    user_data = Depends(auth.get_user_data_dependency()),
+    db: AsyncSession = Depends(get_db)
+):
+    if node_id is None and page_id is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="node_id немесе page_id қажет")
+    root_id = await TreeExportService(db).resolve_root(node_id=node_id, page_id=page_id)
+    # Сессия не нужна на всё время соединения
+    await db.close()
+
+    # EventSource при переподключении присылает id последнего события
+    since = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(sse_events(root_id, since), media_type="text/event-stream", headers=headers)
 
 
 @router.get('/node/{node_id}')
@@ -39,6 +99,39 @@ async def restore_node(node_id: int, user_data = Depends(auth.get_current_user_d
 
 @router.get('/search')
 @standar_atatek
-async def search_data_by_name(query: str, user_data = Depends(auth.get_current_user_dependency()), db: AsyncSession = Depends(get_db)):
+async def search_data_by_name(
+    query: str,
+    parent_id: int | None = None,
+    limit: int = 20,
+    cursor: str | None = None,
+    user_data = Depends(auth.get_current_user_dependency()),
+    db: AsyncSession = Depends(get_db)
+):
     service = TreeService(db)
-    return await service.search_data_by_name(name=query)
+    return await service.search_data_by_name(name=query, parent_id=parent_id, limit=limit, cursor=cursor)
+
+
+@router.get('/export')
+async def export_tree(
+    format: str = "ndjson",
+    node_id: int | None = None,
+    page_id: int | None = None,
+    gzip: bool = False,
+    include_deleted: bool = False,
+    user_data = Depends(auth.get_current_user_dependency()),
+    db: AsyncSession = Depends(get_db)
+):
+    if format not in TreeExportService.FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Формат қолдау көрсетілмейді")
+    root_id = await TreeExportService(db).resolve_root(node_id=node_id, page_id=page_id)
+
+    async def body():
+        # Отдельная сессия: курсор живёт, пока отдаётся ответ
+        async with async_session_factory() as session:
+            async for chunk in TreeExportService(session).export(format, root_id, include_deleted, gzip):
+                yield chunk
+
+    filename = f"tree-{root_id or 'all'}.{TreeExportService.EXTENSIONS[format]}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}{".gz" if gzip else ""}"'}
+    media_type = "application/gzip" if gzip else TreeExportService.FORMATS[format]
+    return StreamingResponse(body(), media_type=media_type, headers=headers)
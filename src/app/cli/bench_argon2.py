@@ -0,0 +1,123 @@
+"""
+Калибровка параметров Argon2 на текущей машине.
+
+    python -m src.app.cli.bench_argon2 --budget-ms 250
+    python -m src.app.cli.bench_argon2 --time-cost 1 2 3 --memory-cost 19456 65536 102400 --parallelism 1 2 4 8
+
+Каждый набор параметров меряется в отдельном подпроцессе, чтобы пиковая
+память (ru_maxrss) относилась только к нему. Подпроцесс считает
+`--iterations` хешей и проверок на пуле из `--workers` потоков — так же,
+как hash_pool в приложении, — и отдаёт латентность и пропускную способность.
+В конце печатается самый тяжёлый набор, у которого p95 проверки укладывается
+в бюджет: его и стоит прописать в ARGON2_TIME_COST / ARGON2_MEMORY_COST /
+ARGON2_PARALLELISM.
+"""
+from __future__ import annotations
+import argparse
+import itertools
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+
+def _percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_worker(args: argparse.Namespace) -> None:
+    """Режим подпроцесса: меряет один набор параметров и печатает JSON."""
+    import resource
+    from concurrent.futures import ThreadPoolExecutor
+    from argon2 import PasswordHasher
+
+    time_cost, memory_cost, parallelism = args.worker
+    ph = PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+    baseline_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    hashed = ph.hash("calibration-password")
+
+    def timed(fn, *fn_args) -> float:
+        started = time.perf_counter()
+        fn(*fn_args)
+        return (time.perf_counter() - started) * 1000
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        started = time.perf_counter()
+        hash_ms = list(pool.map(lambda _: timed(ph.hash, "calibration-password"), range(args.iterations)))
+        verify_started = time.perf_counter()
+        verify_ms = list(pool.map(lambda _: timed(ph.verify, hashed, "calibration-password"), range(args.iterations)))
+        finished = time.perf_counter()
+
+    peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "time_cost": time_cost,
+        "memory_cost": memory_cost,
+        "parallelism": parallelism,
+        "hash_p50_ms": round(statistics.median(hash_ms), 1),
+        "hash_p95_ms": round(_percentile(hash_ms, 0.95), 1),
+        "verify_p50_ms": round(statistics.median(verify_ms), 1),
+        "verify_p95_ms": round(_percentile(verify_ms, 0.95), 1),
+        "verify_per_sec": round(args.iterations / (finished - verify_started), 1),
+        "hash_per_sec": round(args.iterations / (verify_started - started), 1),
+        "peak_mib": round((peak_kib - baseline_kib) / 1024, 1),
+    }))
+
+
+def measure(time_cost: int, memory_cost: int, parallelism: int, workers: int, iterations: int) -> dict:
+    cmd = [
+        sys.executable, "-m", "src.app.cli.bench_argon2",
+        "--worker", str(time_cost), str(memory_cost), str(parallelism),
+        "--workers", str(workers), "--iterations", str(iterations),
+    ]
+    out = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout)
+
+
+def main(args: argparse.Namespace) -> None:
+    results = []
+    for time_cost, memory_cost, parallelism in itertools.product(args.time_cost, args.memory_cost, args.parallelism):
+        result = measure(time_cost, memory_cost, parallelism, args.workers, args.iterations)
+        results.append(result)
+        print(json.dumps(result), flush=True)
+
+    fitting = [r for r in results if r["verify_p95_ms"] <= args.budget_ms]
+    if not fitting:
+        print(f"\nНи один набор не укладывается в {args.budget_ms} ms — уменьшите параметры или --workers", file=sys.stderr)
+        sys.exit(1)
+    best = max(fitting, key=lambda r: (r["memory_cost"] * r["time_cost"], -r["verify_p95_ms"]))
+    print(json.dumps({
+        "recommended": {
+            "ARGON2_TIME_COST": best["time_cost"],
+            "ARGON2_MEMORY_COST": best["memory_cost"],
+            "ARGON2_PARALLELISM": best["parallelism"],
+            "PASSWORD_HASH_WORKERS": args.workers,
+        },
+        "verify_p95_ms": best["verify_p95_ms"],
+        "logins_per_sec": best["verify_per_sec"],
+        "peak_mib": best["peak_mib"],
+    }, indent=2))
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    # Настройки приложения нужны только для значений по умолчанию
+    from src.app.config import settings
+
+    parser = argparse.ArgumentParser(description="Benchmark Argon2 parameter sets and recommend settings")
+    parser.add_argument("--time-cost", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--memory-cost", type=int, nargs="+", default=[19456, 47104, 65536, 102400], help="KiB")
+    parser.add_argument("--parallelism", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--workers", type=int, default=settings.PASSWORD_HASH_WORKERS, help="одновременных хешей, как PASSWORD_HASH_WORKERS")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=250, help="допустимый p95 проверки пароля")
+    parser.add_argument("--worker", type=int, nargs=3, metavar=("T", "M", "P"), help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.worker:
+        run_worker(args)
+    else:
+        main(args)
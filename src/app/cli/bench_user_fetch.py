@@ -0,0 +1,110 @@
+"""
+Сравнение промаха UserCache: прежняя загрузка через selectinload
+против одного JOIN/LATERAL-запроса из UserCache._fetch_from_db.
+
+    python -m src.app.cli.bench_user_fetch --iterations 200
+    python -m src.app.cli.bench_user_fetch --user-id 1 --user-id 42
+
+Redis не используется — меряется только путь до БД. Печатает p50/p95
+латентности, число SQL-запросов на одного пользователя и проверяет,
+что оба варианта возвращают одинаковый UserFull.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import selectinload
+
+from src.app.db import async_session_factory
+from src.app.db.db import async_engine
+from src.app.models import User, UserSubscription
+from src.app.schemas.user import UserFull
+from src.app.utils.cache.user import UserCache
+
+
+async def fetch_selectinload(user_id: int) -> UserFull | None:
+    """Прежняя реализация UserCache._fetch_from_db — для сравнения."""
+    async with async_session_factory() as session:
+        stmt = (
+            select(User)
+            .where(User.id == user_id, User.is_deleted.is_(False))
+            .options(
+                selectinload(User.role),
+                selectinload(User.address),
+                selectinload(User.page),
+                selectinload(User.subscriptions).selectinload(UserSubscription.tariff)
+            )
+        )
+        user = (await session.execute(stmt)).scalar_one_or_none()
+        if not user:
+            return None
+        active_sub = next((s for s in user.subscriptions if s.is_active), None)
+        tariff = active_sub.tariff if active_sub else None
+        return UserFull.model_validate({**user.__dict__, "tariff": tariff}, from_attributes=True)
+
+
+async def measure(fetch, user_ids: list[int], iterations: int, queries: list[int]) -> dict:
+    # Прогрев пула соединений и кэша компиляции SQLAlchemy
+    for user_id in user_ids:
+        await fetch(user_id)
+
+    queries[0] = 0
+    latencies = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        await fetch(user_ids[i % len(user_ids)])
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))], 3),
+        "queries_per_user": round(queries[0] / iterations, 2),
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    user_ids = args.user_id
+    if not user_ids:
+        async with async_session_factory() as session:
+            user_ids = list((await session.scalars(
+                select(User.id).where(User.is_deleted.is_(False)).order_by(User.id).limit(args.sample)
+            )).all())
+    if not user_ids:
+        raise SystemExit("В БД нет пользователей")
+
+    queries = [0]
+
+    @event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+    def count_query(*_):
+        queries[0] += 1
+
+    cache = UserCache()
+    mismatched = [
+        user_id for user_id in user_ids
+        if await fetch_selectinload(user_id) != await cache._fetch_from_db(user_id)
+    ]
+    report = {
+        "users": len(user_ids),
+        "iterations": args.iterations,
+        "selectinload": await measure(fetch_selectinload, user_ids, args.iterations, queries),
+        "single_query": await measure(cache._fetch_from_db, user_ids, args.iterations, queries),
+        "mismatched_users": mismatched,
+    }
+    print(json.dumps(report, indent=2))
+    await async_engine.dispose()
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the UserCache miss path: selectinload vs single query")
+    parser.add_argument("--user-id", type=int, action="append", help="можно указать несколько раз")
+    parser.add_argument("--sample", type=int, default=50, help="сколько пользователей взять из БД, если --user-id не задан")
+    parser.add_argument("--iterations", type=int, default=200)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,233 @@
+"""
+Обход дерева tumalas.kz в ширину с загрузкой узлов в БД.
+
+    python -m src.app.cli.crawl_tree --node-id 1 --concurrency 4 --rate 5 \
+        --checkpoint crawl.json
+
+Узлы берутся по одному запросу на родителя и пишутся тем же пакетным
+upsert-ом, что и фоновая синхронизация (TreeSyncService.save_children).
+Прогресс периодически сохраняется в checkpoint-файл; повторный запуск с тем
+же файлом продолжает обход с места остановки.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select
+
+from src.app.config import settings
+from src.app.db import async_session_factory
+from src.app.models import Tree
+from src.app.utils.http import close_http_clients, get_http_client
+from src.app.utils.sync import TreeSyncService
+
+
+class RateLimiter:
+    """Не больше `rate` запросов в секунду на все воркеры вместе."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            if self._next > now:
+                await asyncio.sleep(self._next - now)
+            self._next = max(now, self._next) + self.interval
+
+
+class TreeCrawler:
+    def __init__(
+        self,
+        concurrency: int = 4,
+        rate: float = 5.0,
+        max_depth: Optional[int] = None,
+        force: bool = False,
+        checkpoint: Optional[str] = None,
+        report_every: float = 10.0,
+    ):
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rate)
+        self.http = get_http_client("tumalas")
+        self.max_depth = max_depth
+        self.force = force
+        self.checkpoint = checkpoint
+        self.report_every = report_every
+
+        # id узла -> относительная глубина; включает и очередь, и узлы в работе
+        self.pending: Dict[int, int] = {}
+        self.failed: Dict[int, int] = {}
+        self.queue: asyncio.Queue[Tuple[int, int]] = asyncio.Queue()
+        self.stats = {"processed": 0, "fetched": 0, "inserted": 0, "errors": 0}
+        self._started = 0.0
+        self._fetched_at_start = 0
+
+    def load_checkpoint(self) -> bool:
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return False
+        with open(self.checkpoint) as f:
+            state = json.load(f)
+        # Упавшие в прошлый раз узлы пробуем снова
+        for node_id, depth in [*state["pending"], *state["failed"]]:
+            self._push(int(node_id), int(depth))
+        self.stats.update(state["stats"])
+        logging.info(f"Resumed from {self.checkpoint}: {len(self.pending)} pending nodes")
+        return True
+
+    def save_checkpoint(self) -> None:
+        if not self.checkpoint:
+            return
+        state = {
+            "pending": list(self.pending.items()),
+            "failed": list(self.failed.items()),
+            "stats": self.stats,
+        }
+        tmp = f"{self.checkpoint}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.checkpoint)
+
+    def _push(self, node_id: int, depth: int) -> None:
+        if node_id in self.pending:
+            return
+        self.pending[node_id] = depth
+        self.queue.put_nowait((node_id, depth))
+
+    async def run(self, root_id: Optional[int] = None) -> Dict[str, int]:
+        if not self.load_checkpoint():
+            if root_id is None:
+                raise SystemExit("--node-id is required when there is no checkpoint to resume")
+            self._push(root_id, 0)
+
+        self._started = time.monotonic()
+        self._fetched_at_start = self.stats["fetched"]
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        reporter = asyncio.create_task(self._reporter())
+        try:
+            await self.queue.join()
+        finally:
+            for task in [*workers, reporter]:
+                task.cancel()
+            await asyncio.gather(*workers, reporter, return_exceptions=True)
+            self.save_checkpoint()
+            self.report()
+        return self.stats
+
+    async def _worker(self) -> None:
+        while True:
+            node_id, depth = await self.queue.get()
+            try:
+                children = await self.crawl_node(node_id)
+            except asyncio.CancelledError:
+                # Узел остаётся в pending и попадёт в checkpoint
+                self.queue.task_done()
+                raise
+            except Exception as e:
+                logging.error(f"Node {node_id} failed: {e}")
+                children = None
+
+            if children is None and self.http.state != "closed":
+                # Упёрлись в circuit breaker — это сбой upstream, а не узла:
+                # ждём, пока breaker пропустит пробный запрос, и возвращаем
+                # узел в очередь (он так и остаётся в pending)
+                await self._wait_for_upstream()
+                self.queue.put_nowait((node_id, depth))
+                self.queue.task_done()
+                continue
+            if children is None:
+                self.failed[node_id] = depth
+                self.stats["errors"] += 1
+            elif self.max_depth is None or depth < self.max_depth:
+                for child_id in children:
+                    self._push(child_id, depth + 1)
+            self.stats["processed"] += 1
+            self.pending.pop(node_id, None)
+            self.queue.task_done()
+
+    async def _wait_for_upstream(self) -> None:
+        # Полуоткрытый breaker занят пробным запросом другого воркера — он скоро решится
+        delay = self.http.reset_timeout if self.http.state == "open" else 1.0
+        logging.warning(f"tumalas circuit breaker is {self.http.state}, retrying in {delay:g}s")
+        await asyncio.sleep(delay)
+
+    async def crawl_node(self, node_id: int) -> Optional[list[int]]:
+        """
+        Синхронизирует узел (если нужно) и возвращает id его детей с t_id.
+        None — upstream не ответил.
+        """
+        async with async_session_factory() as session:
+            node = await session.get(Tree, node_id)
+            if not node or node.t_id is None:
+                return []
+
+            service = TreeSyncService(session)
+            if self.force or service.is_stale(node):
+                await self.limiter.wait()
+                new_nodes = await service.sync_node(node)
+                if new_nodes is None:
+                    return None
+                self.stats["fetched"] += 1
+                self.stats["inserted"] += len(new_nodes)
+
+            result = await session.execute(
+                select(Tree.id).where(Tree.parent_id == node_id, Tree.t_id.isnot(None)).order_by(Tree.id)
+            )
+            return list(result.scalars().all())
+
+    async def _reporter(self) -> None:
+        while True:
+            await asyncio.sleep(self.report_every)
+            self.save_checkpoint()
+            self.report()
+
+    def report(self) -> None:
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+        logging.info(
+            f"processed={self.stats['processed']} fetched={self.stats['fetched']} "
+            f"inserted={self.stats['inserted']} errors={self.stats['errors']} "
+            f"pending={len(self.pending)} "
+            f"rate={(self.stats['fetched'] - self._fetched_at_start) / elapsed:.1f} req/s"
+        )
+
+
+async def main(args: argparse.Namespace) -> None:
+    if args.base_url:
+        settings.TUMALAS_BASE_URL = args.base_url
+
+    crawler = TreeCrawler(
+        concurrency=args.concurrency,
+        rate=args.rate,
+        max_depth=args.max_depth,
+        force=args.force,
+        checkpoint=args.checkpoint,
+        report_every=args.report_every,
+    )
+    try:
+        await crawler.run(root_id=args.node_id)
+    finally:
+        await close_http_clients()
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Crawl tumalas.kz tree breadth-first into the tree table")
+    parser.add_argument("--node-id", type=int, help="id узла в нашей БД, с которого начинается обход")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=5.0, help="максимум запросов к upstream в секунду")
+    parser.add_argument("--max-depth", type=int, default=None, help="сколько поколений обходить под стартовым узлом")
+    parser.add_argument("--force", action="store_true", help="синхронизировать и свежие узлы")
+    parser.add_argument("--checkpoint", default=None, help="файл для сохранения/продолжения обхода")
+    parser.add_argument("--report-every", type=float, default=10.0, help="период отчёта о прогрессе, секунды")
+    parser.add_argument("--base-url", default=None, help="переопределить TUMALAS_BASE_URL (например, локальный стаб)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,50 @@
+"""
+Потоковая выгрузка дерева в файл (или stdout).
+
+    python -m src.app.cli.export_tree --format gedcom --page-id 3 --gzip -o page3.ged.gz
+    python -m src.app.cli.export_tree --format ndjson > tree.ndjson
+
+Использует тот же TreeExportService, что и эндпоинт /tree/export.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import logging
+import sys
+import time
+
+from src.app.core.export import TreeExportService
+from src.app.db import async_session_factory
+
+
+async def main(args: argparse.Namespace) -> None:
+    started = time.monotonic()
+    written = 0
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        async with async_session_factory() as session:
+            service = TreeExportService(session)
+            root_id = await service.resolve_root(node_id=args.node_id, page_id=args.page_id)
+            async for chunk in service.export(args.format, root_id, args.include_deleted, args.gzip):
+                out.write(chunk)
+                written += len(chunk)
+    finally:
+        if args.output:
+            out.close()
+    logging.info(f"Exported {written} bytes in {time.monotonic() - started:.1f}s")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Stream the tree table to NDJSON, CSV or GEDCOM")
+    parser.add_argument("--format", choices=sorted(TreeExportService.FORMATS), default="ndjson")
+    parser.add_argument("--node-id", type=int, default=None, help="выгрузить только поддерево этого узла")
+    parser.add_argument("--page-id", type=int, default=None, help="выгрузить поддерево страницы (Page.tree_id)")
+    parser.add_argument("--include-deleted", action="store_true", help="включить мягко удалённые узлы")
+    parser.add_argument("--gzip", action="store_true", help="сжимать на лету")
+    parser.add_argument("-o", "--output", default=None, help="файл для записи, по умолчанию stdout")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s", stream=sys.stderr)
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,33 @@
+"""
+Прогрев TreeCache/UserCache по счётчикам популярности.
+
+    python -m src.app.cli.prewarm --top-k 500 --concurrency 8
+
+То же самое делается в фоне при старте приложения (PREWARM_ON_STARTUP),
+команда нужна для запуска вручную — например, после сброса Redis.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import logging
+
+from src.app.config import settings
+from src.app.utils.prewarm import CachePrewarmer
+
+
+async def main(args: argparse.Namespace) -> None:
+    report = await CachePrewarmer(top_k=args.top_k, concurrency=args.concurrency).run()
+    print(json.dumps(report, indent=2))
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Warm tree and user caches from popularity counters")
+    parser.add_argument("--top-k", type=int, default=settings.PREWARM_TOP_K, help="сколько самых популярных узлов и пользователей греть")
+    parser.add_argument("--concurrency", type=int, default=settings.PREWARM_CONCURRENCY)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,38 @@
+"""
+Пересчёт служебных полей дерева: path/depth по parent_id и descendant_count.
+
+    python -m src.app.cli.repair_tree
+
+Нужен после ручных правок в БД или если инкрементальные счётчики разошлись
+с реальностью. После пересчёта кэш детей узлов сбрасывается целиком.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import time
+
+from src.app.db import async_session_factory
+from src.app.utils.cache.redis import get_redis
+from src.app.utils.cache.local import invalidate_keys
+from src.app.utils.tree_counts import recompute_tree_counts
+
+
+async def main() -> None:
+    started = time.monotonic()
+    async with async_session_factory() as session:
+        result = await recompute_tree_counts(session)
+
+    r = await get_redis()
+    keys = [key async for key in r.scan_iter(match="tree:node:*")]
+    await invalidate_keys(keys)
+
+    logging.info(
+        f"Tree repaired in {time.monotonic() - started:.1f}s: "
+        f"fixed_paths={result['fixed_paths']} max_depth={result['max_depth']} "
+        f"cache_keys_dropped={len(keys)}"
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    asyncio.run(main())
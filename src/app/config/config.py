@@ -13,6 +13,64 @@ class Settings(BaseSettings):
     REDIS_HOST: str = os.getenv('REDIS_HOST', 'test')
 
     JWT_SECRET_KEY: str = os.getenv('JWT_SECRET_KEY', 'secret_key')
+
+    # Параметры Argon2 (подбираются python -m src.app.cli.bench_argon2).
+    # После изменения старые хеши перехешируются при следующем логине.
+    ARGON2_TIME_COST: int = int(os.getenv('ARGON2_TIME_COST', 2))
+    ARGON2_MEMORY_COST: int = int(os.getenv('ARGON2_MEMORY_COST', 102400))  # KiB
+    ARGON2_PARALLELISM: int = int(os.getenv('ARGON2_PARALLELISM', 8))
+
+    # Argon2: сколько хешей считать одновременно и сколько держать в очереди
+    PASSWORD_HASH_WORKERS: int = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE: int = int(os.getenv('PASSWORD_HASH_QUEUE', 32))
+
+    # Лимиты попыток (скользящее окно в Redis), проверяются до хеширования
+    LOGIN_LIMIT_WINDOW: int = int(os.getenv('LOGIN_LIMIT_WINDOW', 300))  # сек
+    LOGIN_LIMIT_PER_PHONE: int = int(os.getenv('LOGIN_LIMIT_PER_PHONE', 5))
+    LOGIN_LIMIT_PER_IP: int = int(os.getenv('LOGIN_LIMIT_PER_IP', 30))
+    PASSWORD_LIMIT_PER_USER: int = int(os.getenv('PASSWORD_LIMIT_PER_USER', 5))
+    SIGNUP_LIMIT_PER_IP: int = int(os.getenv('SIGNUP_LIMIT_PER_IP', 10))
+    VERIFY_LIMIT_WINDOW: int = int(os.getenv('VERIFY_LIMIT_WINDOW', 600))  # сек
+    VERIFY_LIMIT_PER_USER: int = int(os.getenv('VERIFY_LIMIT_PER_USER', 5))
+
+    # TTL кэшей в Redis, секунды
+    USER_CACHE_TTL: int = int(os.getenv('USER_CACHE_TTL', 600))
+    TREE_CACHE_TTL: int = int(os.getenv('TREE_CACHE_TTL', 600))
+
+    # In-process L1 перед Redis (на каждый процесс uvicorn)
+    L1_CACHE_MAX_ENTRIES: int = int(os.getenv('L1_CACHE_MAX_ENTRIES', 10000))
+    # Предел суммарной длины JSON закэшированных значений, не памяти:
+    # декодированные объекты занимают в куче в несколько раз больше
+    L1_CACHE_MAX_JSON_BYTES: int = int(os.getenv('L1_CACHE_MAX_JSON_BYTES', 32 * 1024 * 1024))
+    L1_CACHE_TTL: int = int(os.getenv('L1_CACHE_TTL', 30))
+
+    # Счётчики просмотров и прогрев кэшей по популярности
+    VIEWS_FLUSH_INTERVAL: int = int(os.getenv('VIEWS_FLUSH_INTERVAL', 10))
+    VIEWS_DECAY_INTERVAL: int = int(os.getenv('VIEWS_DECAY_INTERVAL', 24 * 3600))
+    PREWARM_ON_STARTUP: bool = os.getenv('PREWARM_ON_STARTUP', 'true').lower() == 'true'
+    PREWARM_TOP_K: int = int(os.getenv('PREWARM_TOP_K', 200))
+    PREWARM_CONCURRENCY: int = int(os.getenv('PREWARM_CONCURRENCY', 4))
+
+    # Синхронизация дерева с tumalas.kz
+    TUMALAS_BASE_URL: str = os.getenv('TUMALAS_BASE_URL', 'https://tumalas.kz/wp-admin/admin-ajax.php?action=tuma_cached_childnew_get&nodeid=14&id=')
+    TREE_SYNC_WORKERS: int = int(os.getenv('TREE_SYNC_WORKERS', 2))
+    TREE_SYNC_TTL: int = int(os.getenv('TREE_SYNC_TTL', 3600))
+    # Сколько запрос /tree/ ждёт tumalas.kz для ещё не синхронизированного
+    # узла (одна попытка без повторов), секунды. Не успели — узел уходит в очередь
+    TREE_SYNC_INLINE_TIMEOUT: float = float(os.getenv('TREE_SYNC_INLINE_TIMEOUT', 2))
+    # TTL лока синхронизации одного узла между процессами, секунды. Живой
+    # ведущий продлевает лок, TTL лишь ограничивает, как долго ждать упавшего
+    TREE_SYNC_LOCK_TTL: int = int(os.getenv('TREE_SYNC_LOCK_TTL', 30))
+
+    # In-memory индекс структуры дерева (src/app/utils/tree_index.py):
+    # цепочки предков для /tree/relation и хлебных крошек поиска
+    TREE_INDEX_ENABLED: bool = os.getenv('TREE_INDEX_ENABLED', 'false').lower() == 'true'
+    TREE_INDEX_SNAPSHOT: str = os.getenv('TREE_INDEX_SNAPSHOT', '')
+
+    # SSE-поток изменений дерева (/tree/stream)
+    TREE_STREAM_QUEUE_SIZE: int = int(os.getenv('TREE_STREAM_QUEUE_SIZE', 100))
+    TREE_STREAM_HEARTBEAT: int = int(os.getenv('TREE_STREAM_HEARTBEAT', 15))
+    TREE_STREAM_REPLAY_MAX: int = int(os.getenv('TREE_STREAM_REPLAY_MAX', 1000))
     
 
 
@@ -4,6 +4,7 @@ from .tree import TreeService
 from .profile import ProfileService
 from .ticket import TicketService
 from .page import PageService
+from .export import TreeExportService
 
 __all__ = [
     "AuthService",
@@ -11,5 +12,6 @@ __all__ = [
     "TreeService",
     "ProfileService",
     "TicketService",
-    "PageService"
+    "PageService",
+    "TreeExportService",
 ]
\ No newline at end of file
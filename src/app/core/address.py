@@ -1,7 +1,6 @@
 # src/app/core/system.py
 from fastapi import HTTPException, status
 import httpx
-import asyncio
 from typing import List, Dict, Optional
 import logging
 
@@ -9,7 +8,9 @@ from sqlalchemy import or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.app.models import Address, User
+from src.app.schemas.system import AddressBase
 from src.app.utils.cache import UserCache
+from src.app.utils.http import get_http_client
 
 
 class AddressService:
@@ -18,9 +19,7 @@ class AddressService:
         self.MAX_RESULTS = 5
         self.MIN_QUERY_LENGTH = 2
         self.db = db
-        self.headers = {
-            'User-Agent': 'Atatek Family Tree/1.0'
-        }
+        self.http = get_http_client("nominatim")
         self.cache = UserCache()
 
     async def search_locations(self, query: str) -> List[Dict]:
@@ -117,17 +116,9 @@ class AddressService:
 
             logging.info(f"Querying Nominatim with: {query}")
 
-            # Используем httpx для асинхронных HTTP-запросов
-            async with httpx.AsyncClient(timeout=10.0) as client:  # Увеличиваем таймаут
-                response = await client.get(
-                    self.NOMINATIM_URL,
-                    params=params,
-                    headers=self.headers
-                )
-                response.raise_for_status()
-
-            # Добавляем задержку для соблюдения лимитов API
-            await asyncio.sleep(1)
+            # Общий клиент с пулом соединений, повторами, circuit breaker
+            # и лимитом частоты Nominatim (см. _UPSTREAMS в utils/http.py)
+            response = await self.http.get(self.NOMINATIM_URL, params=params)
 
             # Получаем данные JSON
             data = response.json()
@@ -290,8 +281,8 @@ class AddressService:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Қолданушы табылмады')
         user.address_id = address_id
         await self.db.commit()
-        await self.db.refresh(user)
-        await self.cache.invalidate(user_id)
+        address = await self.db.get(Address, address_id)
+        await self.cache.patch(user_id, {"address": AddressBase.model_validate(address).model_dump() if address else None})
         return {
             "detail": "Қолданушының мекен жайы сәтті ауыстырылды"
         }
\ No newline at end of file
@@ -1,15 +1,25 @@
 # src/app/core/user.py
+import asyncio
+import logging
 from fastapi import HTTPException, status
 from sqlalchemy import select, update, delete
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from typing import List
-from src.app.utils import VerfiyCache, AuthUtils, UserCache
+from src.app.db import async_session_factory
+from src.app.utils import (
+    VerfiyCache, AuthUtils, UserCache,
+    login_phone_limiter, login_ip_limiter, signup_ip_limiter, verify_code_limiter,
+)
 
 from src.app.models import User, UserSubscription
 from src.app.schemas.user import CreateUser, UserResponse, UserBase, LoginUser, UserFull
 
+# Ссылки на фоновые перехеширования, чтобы задачи не собрал GC
+_rehash_tasks: set[asyncio.Task] = set()
+
+
 class AuthService():
 
     def __init__(self, db: AsyncSession):
@@ -34,7 +44,28 @@ class AuthService():
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Қолданушы табылмады")
         return user
 
+    async def _rehash_password(self, user_id: int, password: str, old_hash: str):
+        """
+        Пересчитывает хеш с текущими параметрами ARGON2_*. Запускается в фоне
+        после успешного логина; если пароль за это время сменили, ничего не пишет.
+        """
+        try:
+            new_hash = await self.utils.hash_password_async(password)
+            async with async_session_factory() as session:
+                await session.execute(
+                    update(User)
+                    .where(User.id == user_id, User.password == old_hash)
+                    .values(password=new_hash)
+                )
+                await session.commit()
+        except HTTPException:
+            # Пул хеширования занят — обновим при следующем логине
+            pass
+        except Exception as e:
+            logging.error(f"Password rehash for user {user_id} failed: {e}")
+
     async def _toggle_verificate_user(self, user_id: int, payload: int):
+        await verify_code_limiter.hit(user_id)
         code = await self._get_verify_code(user_id=user_id)
         if code == payload:
             result = await self.db.execute(select(User).where(User.id == user_id))
@@ -45,6 +76,7 @@ class AuthService():
             await self.db.commit()
             await self.db.refresh(user)
             await self.cache.invalidate(user_id=user_id)
+            await verify_code_limiter.reset(user_id)
             return {"detail": "Растау сәтті өтті"}
 
         else:
@@ -67,14 +99,17 @@ class AuthService():
         return {"detail": "Жаңа растау коды қайта жіберілді"}
     #================== MAIN FUNC ==================#
 
-    async def create_user(self, payload: CreateUser):
+    async def create_user(self, payload: CreateUser, client_ip: str | None = None):
+        if client_ip:
+            await signup_ip_limiter.hit(client_ip)
+        password = await self.utils.hash_password_async(payload.password)
         try:
             new_user = User(
                 first_name=payload.first_name,
                 last_name=payload.last_name,
                 middle_name=payload.middle_name,
                 phone=payload.phone,
-                password=self.utils.hash_password(payload.password),
+                password=password,
                 role_id=1,
                 address_id=None,
                 page_id=None,
@@ -96,9 +131,18 @@ class AuthService():
             await self.db.rollback()
             raise HTTPException(status_code=500, detail="Тіркелу кезінде қателік орын алды")
 
-    async def login_user(self, payload: LoginUser):
+    async def login_user(self, payload: LoginUser, client_ip: str | None = None):
+        # Лимиты до поиска и хеширования: перебор не должен стоить нам Argon2
+        if client_ip:
+            await login_ip_limiter.hit(client_ip)
+        await login_phone_limiter.hit(payload.phone)
         user = await self.__get_user_by_phone(payload.phone)
-        if self.utils.verify_password(payload.password, user.password):
+        if await self.utils.verify_password_async(payload.password, user.password):
+            await login_phone_limiter.reset(payload.phone)
+            if self.utils.needs_rehash(user.password):
+                task = asyncio.create_task(self._rehash_password(user.id, payload.password, user.password))
+                _rehash_tasks.add(task)
+                task.add_done_callback(_rehash_tasks.discard)
             return UserResponse.model_validate(user.__dict__)
         else:
             raise HTTPException(
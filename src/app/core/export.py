@@ -0,0 +1,157 @@
+from __future__ import annotations
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterator, Iterable, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import select, exists, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from src.app.models import Tree, Page
+
+
+class TreeExportService:
+    """
+    Потоковая выгрузка дерева (целиком или поддерева) в NDJSON, CSV или GEDCOM.
+
+    Строки читаются серверным курсором пачками по BATCH_SIZE и сразу
+    кодируются, поэтому потребление памяти не зависит от размера дерева.
+    """
+
+    FORMATS = {
+        "ndjson": "application/x-ndjson",
+        "csv": "text/csv",
+        "gedcom": "text/vnd.familysearch.gedcom",
+    }
+    EXTENSIONS = {"ndjson": "ndjson", "csv": "csv", "gedcom": "ged"}
+    COLUMNS = ["id", "parent_id", "t_id", "name", "birth", "death", "depth", "is_deleted"]
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.BATCH_SIZE = 1000
+
+    async def resolve_root(self, node_id: Optional[int] = None, page_id: Optional[int] = None) -> Optional[int]:
+        if page_id is not None:
+            root_id = await self.db.scalar(select(Page.tree_id).where(Page.id == page_id))
+            if root_id is None:
+                raise HTTPException(status_code=404, detail='Page not found')
+            return root_id
+        if node_id is not None and not await self.db.get(Tree, node_id):
+            raise HTTPException(status_code=404, detail='Node not found')
+        return node_id
+
+    def _select(self, root_id: Optional[int], include_deleted: bool, *order_by):
+        stmt = select(*(getattr(Tree, c) for c in self.COLUMNS))
+        if root_id is not None:
+            stmt = stmt.where(or_(Tree.id == root_id, Tree.path.contains([root_id])))
+        if not include_deleted:
+            # Мягко удалённый узел скрывает и всё своё поддерево
+            ancestor = aliased(Tree)
+            stmt = stmt.where(
+                Tree.is_deleted.isnot(True),
+                ~exists().where(and_(ancestor.id == Tree.path.any_(), ancestor.is_deleted.is_(True))),
+            )
+        return stmt.order_by(*order_by).execution_options(yield_per=self.BATCH_SIZE)
+
+    async def _rows(self, stmt) -> AsyncIterator[list]:
+        result = await self.db.stream(stmt)
+        async for partition in result.partitions():
+            yield partition
+
+    async def export(
+        self,
+        fmt: str = "ndjson",
+        root_id: Optional[int] = None,
+        include_deleted: bool = False,
+        gzip: bool = False,
+    ) -> AsyncIterator[bytes]:
+        if fmt not in self.FORMATS:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Формат қолдау көрсетілмейді")
+
+        encoders = {"ndjson": self._ndjson, "csv": self._csv, "gedcom": self._gedcom}
+        chunks = encoders[fmt](root_id, include_deleted)
+        if not gzip:
+            async for chunk in chunks:
+                yield chunk
+            return
+
+        compressor = zlib.compressobj(wbits=31)  # gzip-контейнер
+        async for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    async def _ndjson(self, root_id, include_deleted) -> AsyncIterator[bytes]:
+        async for rows in self._rows(self._select(root_id, include_deleted, Tree.id)):
+            yield "".join(
+                json.dumps(dict(row._mapping), ensure_ascii=False) + "\n" for row in rows
+            ).encode()
+
+    async def _csv(self, root_id, include_deleted) -> AsyncIterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.COLUMNS)
+        async for rows in self._rows(self._select(root_id, include_deleted, Tree.id)):
+            writer.writerows(rows)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+
+    async def _gedcom(self, root_id, include_deleted) -> AsyncIterator[bytes]:
+        """
+        Два прохода курсором: сначала все INDI, затем FAM, по одной семье на
+        родителя. Во втором проходе строки отсортированы по parent_id, так что
+        дети одной семьи идут подряд и в памяти ничего не накапливается.
+        """
+        yield self._lines([
+            "0 HEAD",
+            "1 SOUR ATATEK",
+            "1 GEDC",
+            "2 VERS 5.5.1",
+            "2 FORM LINEAGE-LINKED",
+            "1 CHAR UTF-8",
+        ])
+
+        async for rows in self._rows(self._select(root_id, include_deleted, Tree.id)):
+            lines = []
+            for row in rows:
+                lines += [f"0 @I{row.id}@ INDI", f"1 NAME {self._clean(row.name)}"]
+                if row.birth:
+                    lines += ["1 BIRT", f"2 DATE {self._clean(row.birth)}"]
+                if row.death:
+                    lines += ["1 DEAT", f"2 DATE {self._clean(row.death)}"]
+                # Корень выгрузки — без ссылки на семью за её пределами
+                if row.parent_id is not None and row.id != root_id:
+                    lines.append(f"1 FAMC @F{row.parent_id}@")
+            yield self._lines(lines)
+
+        current = None
+        stmt = self._select(root_id, include_deleted, Tree.parent_id, Tree.id).where(
+            Tree.parent_id.isnot(None)
+        )
+        if root_id is not None:
+            stmt = stmt.where(Tree.id != root_id)
+        async for rows in self._rows(stmt):
+            lines = []
+            for row in rows:
+                if row.parent_id != current:
+                    current = row.parent_id
+                    lines += [f"0 @F{current}@ FAM", f"1 HUSB @I{current}@"]
+                lines.append(f"1 CHIL @I{row.id}@")
+            yield self._lines(lines)
+
+        yield self._lines(["0 TRLR"])
+
+    @staticmethod
+    def _clean(value) -> str:
+        return " ".join(str(value).split())
+
+    @staticmethod
+    def _lines(lines: Iterable[str]) -> bytes:
+        return "".join(f"{line}\n" for line in lines).encode()
@@ -140,8 +140,12 @@ class PageService():
 
             await self.db.commit()
             await self.db.refresh(page)
-            await self.user_cache.invalidate(user_id)
-            return PageBase.model_validate(page.__dict__)
+            # Страница лежит в кэше у всех, кто к ней привязан
+            data = PageBase.model_validate(page.__dict__)
+            owners = await self.db.scalars(select(User.id).where(User.page_id == page_id))
+            for owner_id in owners.all():
+                await self.user_cache.patch(owner_id, {"page": data.model_dump()})
+            return data
         
         except Exception as e:
             raise HTTPException(
@@ -231,6 +235,6 @@ class PageService():
             )
         user.page_id = page_id
         await self.db.commit()
-        await self.db.refresh(user)
-        await self.user_cache.invalidate(user_id)
+        page = await self.db.get(Page, page_id)
+        await self.user_cache.patch(user_id, {"page": PageBase.model_validate(page).model_dump() if page else None})
         return {"detail": "Пайдаланушының парақшасы сәтті орнатылды"}
\ No newline at end of file
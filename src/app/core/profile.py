@@ -1,7 +1,9 @@
 from src.app.schemas.profile import UpdateUser, ResetUserPasswort
-from src.app.utils.cache import UserCache
+from src.app.utils.cache import UserCache, password_user_limiter
 from src.app.utils import AuthUtils
-from src.app.models import User
+from src.app.models import User, Address, Page
+from src.app.schemas.page import PageBase
+from src.app.schemas.system import AddressBase
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
@@ -28,8 +30,19 @@ class ProfileService():
             setattr(user, key, value)
 
         await self.db.commit()
-        await self.cache.invalidate(user_id=user_id)
-        response = await self.cache.get_user_cache(user_id=user_id)
+
+        # Переписываем закэшированный UserFull вместо сброса
+        fields = {k: v for k, v in update_data.items() if k not in ("address_id", "page_id")}
+        # После commit атрибуты user истекли — берём id из запроса
+        if "address_id" in update_data:
+            address_id = update_data["address_id"]
+            address = await self.db.get(Address, address_id) if address_id else None
+            fields["address"] = AddressBase.model_validate(address).model_dump() if address else None
+        if "page_id" in update_data:
+            page_id = update_data["page_id"]
+            page = await self.db.get(Page, page_id) if page_id else None
+            fields["page"] = PageBase.model_validate(page).model_dump() if page else None
+        response = await self.cache.patch(user_id, fields)
         return response
     
     async def update_password(self, user_id: int, payload: ResetUserPasswort):
@@ -42,7 +55,8 @@ class ProfileService():
                 detail='Қолданушы табылмады'
             )
          
-        if  self.utils.verify_password(payload.old_password, user.password) == False:
+        await password_user_limiter.hit(user_id)
+        if await self.utils.verify_password_async(payload.old_password, user.password) == False:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Ескі құпиясөз қате"
@@ -54,9 +68,10 @@ class ProfileService():
                 detail="Құпиясөздер сәйкес келмейді"
             )
         
-        password =  self.utils.hash_password(payload.new_password)
+        password = await self.utils.hash_password_async(payload.new_password)
         user.password = password
         await self.db.commit()
+        await password_user_limiter.reset(user_id)
         await self.db.refresh(user)
 
         response = await self.cache.get_user_cache(user_id=user_id)
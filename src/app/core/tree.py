@@ -1,12 +1,15 @@
 from fastapi import HTTPException, status
-import httpx
-import asyncio
-import logging
-from sqlalchemy import select
+from sqlalchemy import select, update, func, literal, cast, or_, and_, Integer
+from sqlalchemy.dialects.postgresql import ARRAY, REAL
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import selectinload, aliased
 from src.app.models import Tree
-from src.app.utils.cache import UserCache
+from src.app.utils.cache import UserCache, TreeCache, tree_views
+from src.app.utils.sync import TreeSyncService, TreeSyncQueue
+from src.app.utils.events import record_tree_changes, publish_tree_events, fetch_tree_changes
+from src.app.utils.tree_index import tree_index
+from src.app.utils.tree_counts import add_descendants
+from src.app.utils.loader import UserLoader
 
 
 
@@ -14,100 +17,154 @@ class TreeService:
     def __init__(self, db: AsyncSession):
         self.db = db
         self.user_cache = UserCache()
-        self.base_url = 'https://tumalas.kz/wp-admin/admin-ajax.php?action=tuma_cached_childnew_get&nodeid=14&id='
-        self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'application/json, text/javascript, */*; q=0.01',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1'
-        }
+        self.tree_cache = TreeCache()
+        self.SUBTREE_MAX_DEPTH = 10
+        self.SUBTREE_MAX_NODES = 5000
+        # Короче трёх символов pg_trgm не сужает LIKE — был бы полный обход GIN-индекса
+        self.SEARCH_MIN_QUERY_LENGTH = 3
+        self.SEARCH_MAX_LIMIT = 100
+        self.CHILDREN_MAX_LIMIT = 500
+        self.NODES_MAX_IDS = 100
+        self.CHANGES_MAX_LIMIT = 1000
+        self.sync_queue = TreeSyncQueue()
+
+    async def get_tree_on_db(self, node_id: int, user_id: int, limit: int = None, after_id: int = None):
+        """
+        Дети узла. Без `limit` — весь список, с `limit` — страница
+        {"items", "next_cursor"}, следующая запрашивается с after_id=next_cursor.
+        """
+        tree_views.hit(node_id)
+        if limit is not None:
+            limit = max(1, min(limit, self.CHILDREN_MAX_LIMIT))
 
+        # Горячий путь — список детей целиком из Redis
+        if limit is None:
+            cached = await self.tree_cache.get_cached(node_id)
+        else:
+            cached = await self.tree_cache.get_cached_page(node_id, limit, after_id)
+        if cached is not None:
+            return cached
 
-    async def get_tree_on_api(self, id: int, parent_id: int):
-        url = f'{self.base_url}&id={id}'
-        try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(
-                    url,
-                    headers=self.headers
-                )
-                response.raise_for_status()
-            await asyncio.sleep(0.1)
-            data = response.json()
-
-            new_nodes = []
-            for item in data:
-                t_id = int(item['id'])
-
-                # Проверяем, существует ли запись с таким t_id
-                existing_node = await self.db.execute(select(Tree).where(Tree.t_id == t_id))
-                if existing_node.scalars().first():
-                    continue  # Пропускаем, если уже есть в БД
-
-                new_node = Tree(
-                    name=item['name'],
-                    birth=item['birth_year'] if item['birth_year'] not in [None, 0] else None,
-                    death=item['death_year'] if item['death_year'] not in [None, 0] else None,
-                    parent_id=parent_id,
-                    is_deleted=False,
-                    t_id=t_id,
-                    created_by=1,
-                )
-
-                self.db.add(new_node)
-                new_nodes.append(new_node)
-
-            if new_nodes:
-                await self.db.commit()
-            return new_nodes  # Возвращаем список добавленных узлов (может быть пустым)
-
-        except Exception as e:
-            logging.error(f"Ошибка при запросе дерева: {e}")
-            return None  # Возвращаем None, если ошибка
-
-    async def get_tree_on_db(self, node_id: int, user_id: int):
         result = await self.db.execute(select(Tree).where(Tree.id == node_id))
         node = result.scalars().first()
         if not node:
             raise HTTPException(status_code=404, detail='Node not found')
 
-        # Проверяем, нет ли новых данных в API
-        await self.get_tree_on_api(node.t_id, node_id)
-
-        # После запроса к API делаем повторный запрос в БД (на случай обновлений)
-        result = await self.db.execute(select(Tree).where(Tree.parent_id == node_id).order_by(Tree.id))
-        childs = result.scalars().all()
+        # Новый узел пробуем синхронизировать сразу, чтобы первый зритель
+        # увидел детей, — одной короткой попыткой (TREE_SYNC_INLINE_TIMEOUT).
+        # Не вышло, узел устарел или breaker открыт — ставим в очередь фонового
+        # воркера и отвечаем из БД. Узлы без t_id синхронизировать не с чем
+        sync = TreeSyncService(self.db)
+        store = True
+        if node.t_id is not None and sync.is_stale(node):
+            first_sync = node.synced_at is None
+            synced = False
+            if first_sync and sync.http.state != "open":
+                synced = await sync.sync_node(node, inline=True) is not None
+            if not synced:
+                await self.sync_queue.enqueue(node_id)
+                # Детей узла ещё не загружали (upstream недоступен или их
+                # прямо сейчас загружает другой запрос) — ответ из БД не
+                # кладём в кэш, иначе он мог бы лечь поверх инвалидации
+                # от синхронизации и прятать новых детей до TREE_CACHE_TTL
+                store = not first_sync
+        # Кэш читает детей своей сессией — отпускаем соединение этой
+        await self.db.rollback()
 
         # role_id = await self.user_cache.get_user_role(user_id)
+        if limit is None:
+            return await self.tree_cache.refresh_node(node_id, store=store)
+        return await self.tree_cache.refresh_page(node_id, limit, after_id, store=store)
+
+    async def get_subtree(self, node_id: int, depth: int = 3):
+        """
+        Возвращает до `depth` поколений под узлом одним рекурсивным CTE.
+        Удалённые узлы отсекаются вместе с их поддеревом, общее число
+        узлов ограничено SUBTREE_MAX_NODES. Ответ — плоский список с
+        parent_id, клиент сам собирает дерево.
+        """
+        depth = max(1, min(depth, self.SUBTREE_MAX_DEPTH))
+
+        node = await self.db.get(Tree, node_id)
+        if not node or node.is_deleted:
+            raise HTTPException(status_code=404, detail='Node not found')
+
+        def columns(t):
+            return (
+                t.id,
+                t.parent_id,
+                t.name,
+                t.birth,
+                t.death,
+                t.has_info.label("has_info"),
+                t.mini_icon,
+                t.main_icon,
+            )
+
+        walk = (
+            select(*columns(Tree), literal(0).label("level"))
+            .where(Tree.id == node_id)
+            .cte("walk", recursive=True)
+        )
+        child = aliased(Tree)
+        walk = walk.union_all(
+            select(*columns(child), (walk.c.level + 1).label("level"))
+            .join(walk, child.parent_id == walk.c.id)
+            .where(walk.c.level < depth, child.is_deleted.isnot(True))
+        )
+
+        # Все колонки выбираются внутри CTE, а LIMIT стоит прямо на чтении
+        # из него: рекурсивный CTE отдаёт строки по поколениям, поэтому обход
+        # останавливается на лимите, а в урезанном ответе есть родители
+        # всех узлов. JOIN с tree после CTE такого порядка не гарантирует
+        stmt = (
+            select(walk)
+            .where(walk.c.level > 0)
+            .limit(self.SUBTREE_MAX_NODES + 1)
+        )
+        rows = (await self.db.execute(stmt)).all()
+
+        truncated = len(rows) > self.SUBTREE_MAX_NODES
+        rows = sorted(rows[:self.SUBTREE_MAX_NODES], key=lambda row: (row.level, row.id))
 
-        response = []
-        if childs:
-            for child in childs:
-                if child.is_deleted:
-                    continue
-
-                response.append({
-                    "id": child.id,
-                    "name": child.name,
-                    "birth": child.birth if child.birth else None,
-                    "death": child.death if child.death else None,
-                    "info": bool(child.bio),  # Более читабельная проверка
-                    # "untouchable": True if role_id and role_id >= 2 else False,
+        return {
+            "node_id": node_id,
+            "depth": depth,
+            "truncated": truncated,
+            "items": [
+                {
+                    "id": row.id,
+                    "parent_id": row.parent_id,
+                    "level": row.level,
+                    "name": row.name,
+                    "birth": row.birth if row.birth else None,
+                    "death": row.death if row.death else None,
+                    "info": bool(row.has_info),
                     "untouchable": False,
-                    "mini_icon": child.mini_icon or None,  # Можно использовать `or`
-                    "main_icon": child.main_icon or None,
-                })
-        return response
+                    "mini_icon": row.mini_icon or None,
+                    "main_icon": row.main_icon or None,
+                }
+                for row in rows
+            ],
+        }
 
     async def delete_tree_on_page(self, node_id: int):
         result = await self.db.execute(select(Tree).where(Tree.id == node_id))
         node = result.scalars().first()
         if not node:
             raise HTTPException(status_code=404, detail='Node not found')
+        events = []
+        if not node.is_deleted:
+            # Поддерево узла перестаёт быть видимым для предков
+            await add_descendants(self.db, node.path, -(1 + node.descendant_count))
+            events = await record_tree_changes(self.db, [{"op": "delete", "id": node.id, "parent_id": node.parent_id}])
+            events[0]["path"] = node.path
         node.is_deleted = True
         await self.db.commit()
         await self.db.refresh(node)
+        # У всех предков поменялся descendant_count в списках их родителей
+        await self.tree_cache.invalidate_node(*node.path)
+        await publish_tree_events(events)
         return HTTPException(status_code=status.HTTP_204_NO_CONTENT, detail="Сәтті жойылды")
 
     async def restore_tree_on_page(self, node_id: int):
@@ -115,66 +172,198 @@ class TreeService:
         node = result.scalars().first()
         if not node:
             raise HTTPException(status_code=404, detail='Node not found')
-        node.is_deleted = False
+        events = []
+        if node.is_deleted:
+            node.is_deleted = False
+            await self.db.flush()
+            await add_descendants(self.db, node.path, 1 + node.descendant_count)
+            events = await record_tree_changes(self.db, [{"op": "restore", "id": node.id, "parent_id": node.parent_id}])
+            events[0]["path"] = node.path
         await self.db.commit()
         await self.db.refresh(node)
+        await self.tree_cache.invalidate_node(*node.path)
+        await publish_tree_events(events)
         return HTTPException(status_code=status.HTTP_201_CREATED, detail="Сәтті қалпына келтірілді")
 
-    async def search_data_by_name(self, name: str, parent_id: int = None):
-        stmt = select(Tree).where(Tree.name.ilike(f"%{name}%"))
-        result = await self.db.execute(stmt)
-        response = []
-        data = result.scalars().all()
-        for res in data:
-            if res.is_deleted:
-                continue
-            data = await self.get_parents(res.id, res.parent_id)
-            if data == False:
-                continue
-
-            response.append({
-                "id": res.id,
-                "name": res.name,
-                "birth": res.birth if res.birth else None,
-                "death": res.death if res.death else None,
-                "parents": data
-            })  
-        return response
-
-    async def get_parents(self, tree_id: int, parent_id: int = None):
-        parents = []
-        current_id = tree_id
-
-        while current_id is not None:
-            stmt = select(Tree).where(Tree.id == current_id)
-            result = await self.db.execute(stmt)
-            node = result.scalar_one_or_none()
-
-            if not node or node.parent_id is None:
-                break
+    async def move_node(self, node_id: int, new_parent_id: int):
+        """
+        Переносит узел под нового родителя и пересчитывает path/depth
+        у самого узла и всего его поддерева одним UPDATE.
+        HTTP-ручки нет — вызывается из админских/служебных сценариев.
+        """
+        node = await self.db.get(Tree, node_id)
+        parent = await self.db.get(Tree, new_parent_id)
+        if not node or not parent:
+            raise HTTPException(status_code=404, detail='Node not found')
 
-            stmt = select(Tree).where(Tree.id == node.parent_id)
-            result = await self.db.execute(stmt)
-            parent = result.scalar_one_or_none()
-
-            if parent:
-                parents.append({
-                    "id": parent.id,
-                    "name": parent.name,
-                })
-                current_id = parent.id
-            else:
+        # Блокируем узел, нового родителя и его предков (по возрастанию id —
+        # без взаимоблокировок): параллельный перенос любого из них ждёт
+        # нашего коммита, и проверка на цикл ниже видит актуальные path
+        locked = sorted({node.id, parent.id, *(parent.path or [])})
+        await self.db.execute(
+            select(Tree.id).where(Tree.id.in_(locked)).order_by(Tree.id).with_for_update()
+        )
+        await self.db.refresh(node)
+        await self.db.refresh(parent)
+        if not set(parent.path or []) <= set(locked):
+            # Родителя успели перенести между чтением и блокировкой
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Ағаш өзгерді, қайталап көріңіз")
+        if parent.is_deleted:
+            raise HTTPException(status_code=404, detail='Node not found')
+        if parent.id == node.id or node.id in (parent.path or []):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Түйінді өз ұрпағына көшіруге болмайды")
+
+        old_len = len(node.path)
+        new_path = parent.child_path
+
+        # Счётчики потомков: уносим поддерево со старой линии, добавляем на новую
+        if not node.is_deleted:
+            moved = 1 + node.descendant_count
+            await add_descendants(self.db, node.path, -moved)
+            await add_descendants(self.db, new_path, moved)
+
+        # Потомки: path = старый_путь + [node.id] + хвост -> новый_путь + [node.id] + хвост
+        await self.db.execute(
+            update(Tree)
+            .where(Tree.path.contains([node.id]))
+            .values(
+                path=func.array_cat(
+                    literal(new_path, ARRAY(Integer)),
+                    Tree.path[old_len + 1:func.cardinality(Tree.path)],
+                ),
+                depth=Tree.depth - old_len + len(new_path),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        old_path = node.path
+        events = await record_tree_changes(self.db, [{
+            "op": "move",
+            "id": node_id,
+            "parent_id": new_parent_id,
+            "old_parent_id": node.parent_id,
+            "depth": len(new_path),
+        }])
+        # Линии предков — только для рассылки подписчикам поддеревьев, в журнал не пишутся
+        events[0].update(path=new_path, old_path=old_path)
+        node.parent_id = parent.id
+        node.path = new_path
+        node.depth = len(new_path)
+        await self.db.commit()
+        await self.tree_cache.invalidate_node(*old_path, *new_path)
+        await publish_tree_events(events)
+        return {"detail": "Түйін сәтті көшірілді"}
+
+    async def search_data_by_name(self, name: str, parent_id: int = None, limit: int = 20, cursor: str = None):
+        """
+        Поиск узлов по подстроке имени.
+        Использует trigram-индекс по name_normalized, сортирует по similarity
+        и отдаёт страницы по курсору вида "<score>:<id>".
+        """
+        query = name.strip().lower()
+        limit = max(1, min(limit, self.SEARCH_MAX_LIMIT))
+        if len(query) < self.SEARCH_MIN_QUERY_LENGTH:
+            return {"items": [], "next_cursor": None}
+
+        score = func.similarity(Tree.name_normalized, query)
+        # С загруженным tree_index цепочки предков берутся из памяти, path не читаем
+        use_index = tree_index.loaded
+        columns = [Tree.id, Tree.name, Tree.birth, Tree.death, score.label("score")]
+        if not use_index:
+            columns.append(Tree.path)
+        stmt = (
+            select(*columns)
+            .where(
+                Tree.name_normalized.contains(query, autoescape=True),
+                Tree.is_deleted.isnot(True),
+                Tree.depth > 0,
+            )
+            .order_by(score.desc(), Tree.id)
+            .limit(limit + 1)
+        )
+        if parent_id:
+            stmt = stmt.where(Tree.path.contains([parent_id]))
+        if cursor:
+            try:
+                last_score, last_id = cursor.split(":")
+                last_score, last_id = float(last_score), int(last_id)
+            except ValueError:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Курсор қате")
+            # similarity() возвращает real, поэтому сравниваем в том же типе
+            last_score = cast(last_score, REAL)
+            stmt = stmt.where(or_(score < last_score, and_(score == last_score, Tree.id > last_id)))
+
+        rows = (await self.db.execute(stmt)).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = f"{rows[-1].score!r}:{rows[-1].id}"
+
+        if use_index:
+            lineages = {row.id: tree_index.ancestors(row.id) for row in rows if tree_index.has(row.id)}
+            # Узлы, событие о которых до индекса ещё не дошло
+            missing = [row.id for row in rows if row.id not in lineages]
+            if missing:
+                result = await self.db.execute(select(Tree.id, Tree.path).where(Tree.id.in_(missing)))
+                lineages.update({row.id: row.path or [] for row in result})
+        else:
+            lineages = {row.id: row.path or [] for row in rows}
+
+        # Имена всех предков всех найденных узлов одним запросом
+        ancestor_ids = {a_id for lineage in lineages.values() for a_id in lineage}
+        names = {}
+        if ancestor_ids:
+            result = await self.db.execute(select(Tree.id, Tree.name).where(Tree.id.in_(ancestor_ids)))
+            names = {row.id: row.name for row in result}
+
+        items = []
+        for row in rows:
+            items.append({
+                "id": row.id,
+                "name": row.name,
+                "birth": row.birth if row.birth else None,
+                "death": row.death if row.death else None,
+                "parents": [{"id": a_id, "name": names.get(a_id)} for a_id in lineages.get(row.id, [])]
+            })
+        return {"items": items, "next_cursor": next_cursor}
+
+    async def get_relation(self, a: int, b: int):
+        """
+        Ближайший общий предок двух узлов и путь между ними.
+        Линии предков берутся из path (или из tree_index, если он загружен),
+        LCA — их самый длинный общий префикс.
+        """
+        if tree_index.loaded and tree_index.has(a) and tree_index.has(b):
+            lineages = {node_id: [*tree_index.ancestors(node_id), node_id] for node_id in (a, b)}
+        else:
+            result = await self.db.execute(select(Tree.id, Tree.path).where(Tree.id.in_([a, b])))
+            lineages = {row.id: [*row.path, row.id] for row in result}
+        if a not in lineages or b not in lineages:
+            raise HTTPException(status_code=404, detail='Node not found')
+
+        line_a, line_b = lineages[a], lineages[b]
+        common = 0
+        for x, y in zip(line_a, line_b):
+            if x != y:
                 break
+            common += 1
+        if not common:
+            return {"a": a, "b": b, "lca": None, "up": None, "down": None, "path": []}
 
-        if not parents:
-            return False
+        # a -> ... -> lca -> ... -> b
+        path_ids = [*reversed(line_a[common - 1:]), *line_b[common:]]
+        result = await self.db.execute(select(Tree.id, Tree.name).where(Tree.id.in_(path_ids)))
+        names = {row.id: row.name for row in result}
 
-        # проверяем наличие конкретного предка
-        if parent_id and not any(p["id"] == parent_id for p in parents):
-            return False
+        lca = line_a[common - 1]
+        return {
+            "a": a,
+            "b": b,
+            "lca": {"id": lca, "name": names.get(lca)},
+            "up": len(line_a) - common,
+            "down": len(line_b) - common,
+            "path": [{"id": node_id, "name": names.get(node_id)} for node_id in path_ids],
+        }
 
-        return parents[::-1]
-    
     async def get_tree_data(self, node_id: int):
         result = await self.db.execute(
             select(Tree)
@@ -208,3 +397,69 @@ class TreeService:
                 "last_name": node.updated_by_user.last_name if node.updated_by_user else None,
             }
         }
+
+    async def get_tree_nodes(self, node_ids: list[int]):
+        """
+        Данные нескольких узлов за один запрос — как get_tree_data, но
+        авторы и редакторы всех узлов загружаются одним батчем через UserLoader.
+        """
+        node_ids = list(dict.fromkeys(node_ids))
+        if len(node_ids) > self.NODES_MAX_IDS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Бір сұраныста {self.NODES_MAX_IDS} түйіннен артық болмауы керек"
+            )
+        if not node_ids:
+            return []
+
+        result = await self.db.execute(
+            select(
+                Tree.id,
+                Tree.name,
+                Tree.mini_icon,
+                Tree.main_icon,
+                Tree.birth,
+                Tree.death,
+                Tree.bio,
+                Tree.created_by,
+                Tree.updated_by,
+            ).where(Tree.id.in_(node_ids))
+        )
+        rows = {row.id: row for row in result}
+
+        # Сначала ставим в очередь всех пользователей, потом ждём — один батч
+        loader = UserLoader(self.db)
+        found = [rows[node_id] for node_id in node_ids if node_id in rows]
+        users = await loader.load_many([u for row in found for u in (row.created_by, row.updated_by)])
+        empty_user = {"id": None, "first_name": None, "last_name": None}
+
+        items = []
+        for i, row in enumerate(found):
+            created_by, updated_by = users[2 * i], users[2 * i + 1]
+            items.append({
+                "id": row.id,
+                "name": row.name,
+                "mini_icon": row.mini_icon,
+                "main_icon": row.main_icon,
+                "birth": row.birth,
+                "death": row.death,
+                "bio": row.bio,
+                "created_by": created_by or empty_user,
+                "updated_by": updated_by or empty_user,
+            })
+        return items
+
+    async def get_changes(self, since: int = 0, limit: int = 500):
+        """
+        Изменения дерева с версией больше `since`, по возрастанию версии.
+        Клиент повторяет запрос с since=next_since, пока has_more.
+        """
+        limit = max(1, min(limit, self.CHANGES_MAX_LIMIT))
+        items = await fetch_tree_changes(self.db, since, limit + 1)
+        has_more = len(items) > limit
+        items = items[:limit]
+        return {
+            "items": items,
+            "next_since": items[-1]["version"] if items else since,
+            "has_more": has_more,
+        }
@@ -8,7 +8,7 @@ from .user import User
 
 # Page and tree models
 from .page import Page, PageModerator
-from .tree import Tree
+from .tree import Tree, TreeChange
 
 # Ticket models
 from .ticket import Ticket, TicketType, TicketStatus, TicketAddData, TicketEditData
@@ -27,6 +27,7 @@ __all__ = [
     "Page",
     "PageModerator",
     "Tree",
+    "TreeChange",
     # tickets
     "Ticket",
     "TicketType",
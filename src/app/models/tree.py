@@ -1,17 +1,30 @@
 from datetime import datetime
 
-from sqlalchemy import Text, func, Integer, ForeignKey
+from sqlalchemy import Text, func, text, Integer, BigInteger, String, JSON, ForeignKey, Index, Computed, and_
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.app.db import Base
 
 
 class Tree(Base):
+    """
+    Узел генеалогического дерева.
+
+    `path` хранит id всех предков от корня до родителя (без самого узла),
+    `depth` равен длине `path`. Оба поля заполняются при вставке и
+    пересчитываются при смене родителя (см. TreeService.move_node).
+    `descendant_count` — число видимых (не скрытых удалением) потомков,
+    поддерживается инкрементально, см. src/app/utils/tree_counts.py.
+    `synced_at` — время последней синхронизации детей узла с tumalas.kz.
+    """
     __tablename__ = 'tree'
 
     id: Mapped[int] = mapped_column(primary_key=True)
 
     name: Mapped[str] = mapped_column(nullable=False)
+    name_normalized: Mapped[str] = mapped_column(Computed("lower(name)", persisted=True), nullable=True)
     birth: Mapped[str] = mapped_column(nullable=True)
     death: Mapped[str] = mapped_column(nullable=True)
     bio: Mapped[str] = mapped_column(Text, nullable=True)
@@ -26,11 +39,16 @@ class Tree(Base):
     updated_at: Mapped[datetime] = mapped_column(nullable=True, server_default=func.now(), server_onupdate=func.now())
 
     is_deleted: Mapped[bool] = mapped_column(nullable=True, default=False)
-    t_id: Mapped[int] = mapped_column(nullable=True)
+    t_id: Mapped[int] = mapped_column(nullable=True, unique=True, index=True)
+    synced_at: Mapped[datetime] = mapped_column(nullable=True)
 
     # вот тут добавили ForeignKey
     parent_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("tree.id"), nullable=True)
 
+    path: Mapped[list[int]] = mapped_column(ARRAY(Integer), nullable=False, default=list, server_default="{}")
+    depth: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    descendant_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+
     created_by_user = relationship("User", foreign_keys=[created_by], back_populates="created_tree")
     updated_by_user = relationship("User", foreign_keys=[updated_by], back_populates="updated_tree")
 
@@ -44,4 +62,55 @@ class Tree(Base):
     children: Mapped[list["Tree"]] = relationship(
         "Tree",
         back_populates="parent"
-    )
\ No newline at end of file
+    )
+
+    __table_args__ = (
+        Index("ix_tree_path", "path", postgresql_using="gin"),
+        # Дети узла по порядку id — для keyset-пагинации в /tree/
+        Index("ix_tree_parent_id_id", "parent_id", "id"),
+        Index(
+            "ix_tree_name_normalized_trgm",
+            "name_normalized",
+            postgresql_using="gin",
+            postgresql_ops={"name_normalized": "gin_trgm_ops"},
+        ),
+    )
+
+    @hybrid_property
+    def has_info(self) -> bool:
+        """Есть ли у узла биография — без загрузки самого текста в SQL-запросах."""
+        return bool(self.bio)
+
+    @has_info.inplace.expression
+    @classmethod
+    def _has_info_expression(cls):
+        return and_(cls.bio.isnot(None), cls.bio != '')
+
+    @property
+    def child_path(self) -> list[int]:
+        """Путь, который получают прямые потомки узла."""
+        return [*(self.path or []), self.id]
+
+
+class TreeChange(Base):
+    """
+    Журнал изменений дерева (только добавление записей).
+
+    `version` растёт монотонно, клиенты запоминают последнюю увиденную и
+    забирают только новые изменения через /tree/changes?since=<version>.
+    `op`: insert / delete / restore / move. В `data` — изменившиеся поля.
+    `tx_id` — id записавшей транзакции: версии выдаются из sequence до
+    коммита, поэтому отдаём только записи транзакций старше самой старой
+    незавершённой, иначе клиент может проскочить запоздавшую версию.
+    """
+    __tablename__ = 'tree_changes'
+
+    version: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    node_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    parent_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    op: Mapped[str] = mapped_column(String(16), nullable=False)
+    data: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    tx_id: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, server_default=text("(pg_current_xact_id()::text)::bigint")
+    )
+    created_at: Mapped[datetime] = mapped_column(nullable=False, server_default=func.now())
@@ -1,3 +1,4 @@
 from .auth import AuthUtils
 from .cache import *
-from .decorators import *
\ No newline at end of file
+from .decorators import *
+from .sync import *
\ No newline at end of file
@@ -1,7 +1,77 @@
 from __future__ import annotations
+import asyncio
 import secrets
-from typing import Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
 from argon2 import PasswordHasher, exceptions as argon2_exceptions
+from fastapi import HTTPException, status
+from src.app.config import settings
+
+
+class HashPool:
+    """
+    Отдельный пул потоков для Argon2.
+
+    Каждый хеш занимает memory_cost памяти и несколько ядер, поэтому
+    одновременно считается не больше `workers` хешей, ещё `max_queue`
+    ждут в очереди, а всё сверх этого сразу получает 503 — всплеск логинов
+    не съест память пода и не займёт общий пул потоков event loop.
+    argon2-cffi отпускает GIL на время вычисления, так что потоков достаточно.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.limit = workers + max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._stats = {"completed": 0, "failed": 0, "cancelled": 0, "rejected": 0}
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self._pending >= self.limit:
+            self._stats["rejected"] += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Сервер қазір бос емес, сәлден кейін қайталап көріңіз",
+                headers={"Retry-After": "1"},
+            )
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="argon2")
+        loop = asyncio.get_running_loop()
+        job = self._executor.submit(fn, *args)
+        self._pending += 1
+        # Задача считается выполняемой, пока не закончился сам хеш: если клиент
+        # отвалился и корутину отменили, поток всё равно досчитывает его
+        job.add_done_callback(lambda done: self._call_in_loop(loop, done))
+        return await asyncio.wrap_future(job)
+
+    def _call_in_loop(self, loop: asyncio.AbstractEventLoop, job: Future) -> None:
+        try:
+            loop.call_soon_threadsafe(self._finished, job)
+        except RuntimeError:
+            # Event loop уже закрыт — процесс завершается
+            pass
+
+    def _finished(self, job: Future) -> None:
+        self._pending -= 1
+        if job.cancelled():
+            self._stats["cancelled"] += 1
+        elif job.exception() is not None:
+            self._stats["failed"] += 1
+        else:
+            self._stats["completed"] += 1
+
+    def shutdown(self) -> None:
+        """Останавливает потоки; задачи, не успевшие начаться, отменяются."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._stats, "pending": self._pending, "workers": self.workers, "limit": self.limit}
+
+
+hash_pool = HashPool(workers=settings.PASSWORD_HASH_WORKERS, max_queue=settings.PASSWORD_HASH_QUEUE)
+
 
 class AuthUtils:
     """
@@ -10,15 +80,15 @@ class AuthUtils:
       - хеширования пароля с использованием Argon2
       - верификации пароля против хеша Argon2
 
-    Использует argon2-cffi (PasswordHasher). По умолчанию параметры безопасны для
-    общих случаев, но вы можете передать свои при инициализации.
+    Использует argon2-cffi (PasswordHasher). Параметры по умолчанию берутся из
+    настроек ARGON2_*, но вы можете передать свои при инициализации.
     """
 
     def __init__(
         self,
-        time_cost: int = 2,
-        memory_cost: int = 102400,  # в kibibytes (100 MiB)
-        parallelism: int = 8,
+        time_cost: int = settings.ARGON2_TIME_COST,
+        memory_cost: int = settings.ARGON2_MEMORY_COST,  # в kibibytes (100 MiB по умолчанию)
+        parallelism: int = settings.ARGON2_PARALLELISM,
         hash_len: int = 32,
         salt_len: int = 16,
     ):
@@ -78,6 +148,14 @@ class AuthUtils:
             # прочие ошибки верификации (например повреждённый хеш)
             return False
 
+    async def hash_password_async(self, password: str) -> str:
+        """hash_password в пуле hash_pool, не блокирует event loop."""
+        return await hash_pool.run(self.hash_password, password)
+
+    async def verify_password_async(self, password: str, hashed: str) -> bool:
+        """verify_password в пуле hash_pool, не блокирует event loop."""
+        return await hash_pool.run(self.verify_password, password, hashed)
+
     def needs_rehash(self, hashed: str) -> bool:
         """
         Опционально: проверка, нужно ли перехешировать старый хеш
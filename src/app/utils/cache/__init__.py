@@ -1,3 +1,6 @@
 from .verify import VerfiyCache
 from .user import UserCache
-from .tree import TreeCache
\ No newline at end of file
+from .tree import TreeCache
+from .local import LocalCacheInvalidator, local_cache
+from .views import ViewCounterFlusher, tree_views, user_views
+from .ratelimit import RateLimiter, login_phone_limiter, login_ip_limiter, password_user_limiter, signup_ip_limiter, verify_code_limiter
@@ -0,0 +1,172 @@
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, Optional, Tuple
+from .redis import get_redis
+from src.app.config import settings
+
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+
+class LocalCache:
+    """
+    In-process LRU + TTL кэш перед Redis (L1).
+
+    Хранит уже декодированные значения, поэтому попадание не стоит ни
+    сетевого запроса, ни json.loads. Размер ограничен и по числу ключей,
+    и по суммарному объёму JSON, из которого значение было получено, —
+    это не предел памяти: декодированные dict занимают в куче в разы больше.
+    Значения считаются неизменяемыми — вызывающий код не должен их править.
+
+    Инвалидация, пришедшая, пока читатель ждал Redis или БД, не должна
+    быть перезаписана его старым значением. Поэтому читатель берёт
+    generation() до запроса и передаёт его в set(): если ключ за это время
+    инвалидировали, значение в L1 не кладётся.
+    """
+
+    # Сколько последних инвалидаций помнить по ключам; более старые
+    # считаются случившимися «только что» для всех читателей старше них
+    MAX_TRACKED_INVALIDATIONS = 10000
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data: OrderedDict[str, Tuple[float, int, Any]] = OrderedDict()
+        self._bytes = 0
+        self._generation = 0
+        # key -> generation последней инвалидации
+        self._invalidated: OrderedDict[str, int] = OrderedDict()
+        # Инвалидации до этого generation забыты (или был clear())
+        self._forgotten = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, _, value = item
+        if expires_at < time.monotonic():
+            self.delete(key)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def generation(self) -> int:
+        return self._generation
+
+    def set(self, key: str, value: Any, size: int, generation: Optional[int] = None) -> None:
+        """`generation` — значение generation() до чтения из Redis/БД."""
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        if generation is not None and (
+            generation < self._forgotten or self._invalidated.get(key, -1) > generation
+        ):
+            return
+        self.delete(key)
+        self._data[key] = (time.monotonic() + self.ttl, size, value)
+        self._bytes += size
+        while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, old_size, _) = self._data.popitem(last=False)
+            self._bytes -= old_size
+
+    def delete(self, key: str) -> None:
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._bytes -= item[1]
+
+    def invalidate(self, key: str) -> None:
+        """Удаляет ключ по сообщению об изменении данных."""
+        self.delete(key)
+        self._generation += 1
+        self._invalidated.pop(key, None)
+        self._invalidated[key] = self._generation
+        while len(self._invalidated) > self.MAX_TRACKED_INVALIDATIONS:
+            _, forgotten = self._invalidated.popitem(last=False)
+            self._forgotten = forgotten
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._bytes = 0
+        self._generation += 1
+        self._invalidated.clear()
+        self._forgotten = self._generation
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+local_cache = LocalCache(
+    max_entries=settings.L1_CACHE_MAX_ENTRIES,
+    max_bytes=settings.L1_CACHE_MAX_JSON_BYTES,
+    ttl=settings.L1_CACHE_TTL,
+)
+
+
+async def invalidate_keys(keys: Iterable[str]) -> None:
+    """
+    Удаляет ключи из Redis и из L1 во всех процессах:
+    локально — сразу, в остальных — через Redis pub/sub.
+    """
+    keys = list(keys)
+    if not keys:
+        return
+    r = await get_redis()
+    await r.delete(*keys)
+    await drop_local_keys(keys)
+
+
+async def drop_local_keys(keys: Iterable[str]) -> None:
+    """
+    Удаляет ключи только из L1 всех процессов, Redis не трогает —
+    для значений, которые только что перезаписаны в Redis.
+    """
+    keys = list(keys)
+    if not keys:
+        return
+    for key in keys:
+        local_cache.invalidate(key)
+    r = await get_redis()
+    await r.publish(INVALIDATION_CHANNEL, json.dumps(keys))
+
+
+class LocalCacheInvalidator:
+    """
+    Подписка на INVALIDATION_CHANNEL, удаляющая ключи из L1 этого процесса.
+    Запускается в lifespan, по одной на процесс uvicorn.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="local-cache-invalidator")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                r = await get_redis()
+                async with r.pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL)
+                    # Пока подписки не было, сообщения могли потеряться
+                    local_cache.clear()
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        for key in json.loads(message["data"]):
+                            local_cache.invalidate(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Local cache invalidator error: {e}")
+                local_cache.clear()
+                await asyncio.sleep(1)
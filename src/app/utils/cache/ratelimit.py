@@ -0,0 +1,82 @@
+from __future__ import annotations
+import math
+import secrets
+from collections import Counter
+from typing import Dict
+from fastapi import HTTPException, status
+from .redis import get_redis
+from src.app.config import settings
+
+
+# Скользящее окно: ZSET с временем каждой попытки (мс по часам Redis,
+# чтобы поды с разным временем считали одинаково). Отклонённые попытки
+# в окно не пишутся. Возвращает {1, 0} или {0, через сколько мс можно снова}.
+_SLIDING_WINDOW_LUA = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+if redis.call('ZCARD', KEYS[1]) >= limit then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    return {0, tonumber(oldest[2]) + window - now}
+end
+redis.call('ZADD', KEYS[1], now, ARGV[3])
+redis.call('PEXPIRE', KEYS[1], window)
+return {1, 0}
+"""
+
+
+class RateLimiter:
+    """
+    Распределённый лимит попыток: не больше `limit` за последние `window`
+    секунд на ключ (телефон, IP, user_id). Проверка и запись — один Lua-скрипт,
+    поэтому все поды делят одно окно без гонок.
+    """
+
+    # name -> число пропущенных / отклонённых попыток в этом процессе
+    allowed: Counter[str] = Counter()
+    limited: Counter[str] = Counter()
+
+    def __init__(self, name: str, limit: int, window: int):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self._KEY_PATTERN = "ratelimit:" + name + ":{key}"
+
+    async def hit(self, key: str | int) -> None:
+        """Засчитывает попытку или бросает 429 с Retry-After."""
+        r = await get_redis()
+        allowed, retry_ms = await r.eval(
+            _SLIDING_WINDOW_LUA,
+            1,
+            self._KEY_PATTERN.format(key=key),
+            self.limit,
+            self.window * 1000,
+            secrets.token_hex(8),
+        )
+        if allowed:
+            self.allowed[self.name] += 1
+            return
+        self.limited[self.name] += 1
+        retry_after = max(1, math.ceil(int(retry_ms) / 1000))
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Әрекет саны шектен асты, {retry_after} секундтан кейін қайталаңыз",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    async def reset(self, key: str | int) -> None:
+        r = await get_redis()
+        await r.delete(self._KEY_PATTERN.format(key=key))
+
+    @classmethod
+    def stats(cls) -> Dict[str, Dict[str, int]]:
+        return {"allowed": dict(cls.allowed), "limited": dict(cls.limited)}
+
+
+login_phone_limiter = RateLimiter("login:phone", settings.LOGIN_LIMIT_PER_PHONE, settings.LOGIN_LIMIT_WINDOW)
+login_ip_limiter = RateLimiter("login:ip", settings.LOGIN_LIMIT_PER_IP, settings.LOGIN_LIMIT_WINDOW)
+password_user_limiter = RateLimiter("password:user", settings.PASSWORD_LIMIT_PER_USER, settings.LOGIN_LIMIT_WINDOW)
+signup_ip_limiter = RateLimiter("signup:ip", settings.SIGNUP_LIMIT_PER_IP, settings.LOGIN_LIMIT_WINDOW)
+verify_code_limiter = RateLimiter("verify:user", settings.VERIFY_LIMIT_PER_USER, settings.VERIFY_LIMIT_WINDOW)
@@ -1,129 +1,170 @@
 from __future__ import annotations
 import json
-from typing import Any, Dict
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional
 from .redis import get_redis
+from .local import local_cache, invalidate_keys
 from fastapi import HTTPException
-import httpx
-import asyncio
 from sqlalchemy import select
+from src.app.config import settings
 from src.app.models import Tree
 from src.app.db import async_session_factory
 
 
 
 class TreeCache:
+    """
+    Кэш списка детей узла дерева (`tree:node:{node_id}`).
+    Страницы при постраничной выдаче лежат в хэше `tree:node:{node_id}:pages`
+    с полями "<after_id>:<limit>", чтобы сбрасываться вместе со списком.
+
+    Инвалидация — по родителю, чей список детей изменился:
+    удаление/восстановление/перенос узла и синхронизация с tumalas.kz.
+    """
+
     def __init__(self):
-        self._DEFAULT_TTL = 600
+        self._DEFAULT_TTL = settings.TREE_CACHE_TTL
         self._KEY_PATTERN = "tree:node:{node_id}"
-        self.base_url = 'https://tumalas.kz/wp-admin/admin-ajax.php?action=tuma_cached_childnew_get&nodeid=14&id='
-        self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'application/json, text/javascript, */*; q=0.01',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1'
-        }
+        self._PAGES_KEY_PATTERN = "tree:node:{node_id}:pages"
 
 
-    async def get_node(self, node_id: int) -> Dict[str, Any]:
+    async def get_node(self, node_id: int) -> List[Dict[str, Any]]:
         """
-        Получаем актуальные данные о пользователе из Redis
+        Получаем детей узла из Redis, при промахе — из БД
+        """
+        cached = await self.get_cached(node_id)
+        if cached is not None:
+            return cached
+        return await self.refresh_node(node_id)
+
+    async def get_cached(self, node_id: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Только Redis, без похода в БД. None — если ключа нет.
         """
-        r = await get_redis()
         key = self._KEY_PATTERN.format(node_id=node_id)
+        if (cached := local_cache.get(key)) is not None:
+            return cached
 
+        generation = local_cache.generation()
+        r = await get_redis()
         if raw := await r.get(key):
-            return json.loads(raw)
-
-        meta = await self._fetch_from_db(node_id)
-        if meta:
-            await self.set_node(node_id, meta)
+            meta = json.loads(raw)
+            local_cache.set(key, meta, len(raw), generation)
             return meta
+        return None
 
-        return {"status": False, "details": "not found"}
+    async def refresh_node(self, node_id: int, store: bool = True) -> List[Dict[str, Any]]:
+        """
+        Перечитываем детей узла из БД и кладём в кэш (если `store`)
+        """
+        generation = local_cache.generation()
+        meta = await self._fetch_from_db(node_id)
+        if store:
+            await self.set_node(node_id, meta, generation)
+        return meta
 
-    async def set_node(self, node_id: int, meta: Dict[str, Any]):
+    async def set_node(self, node_id: int, meta: List[Dict[str, Any]], generation: Optional[int] = None):
         """
-        Сохраняем данные пользователя в кэш
+        Сохраняем детей узла в кэш. `generation` — см. LocalCache.set
         """
         r = await get_redis()
         key = self._KEY_PATTERN.format(node_id=node_id)
-        await r.set(key, json.dumps(meta), ex=self._DEFAULT_TTL)
+        raw = json.dumps(meta)
+        await r.set(key, raw, ex=self._DEFAULT_TTL)
+        local_cache.set(key, meta, len(raw), generation)
 
-    async def invalidate_node(self, node_id: int) -> None:
+    async def get_cached_page(self, node_id: int, limit: int, after_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
         """
-        Удаляем данные из кэша
+        Страница детей из кэша: нарезаем полный список, если он уже есть,
+        иначе ищем ранее сохранённую страницу. None — промах.
         """
+        children = await self.get_cached(node_id)
+        if children is not None:
+            return self._slice(children, limit, after_id)
+
         r = await get_redis()
-        key = self._KEY_PATTERN.format(node_id=node_id)
-        await r.delete(key)
+        key = self._PAGES_KEY_PATTERN.format(node_id=node_id)
+        if raw := await r.hget(key, f"{after_id or 0}:{limit}"):
+            return json.loads(raw)
+        return None
 
-    async def _fetch_from_db(self, node_id: int) -> dict | None:
+    async def refresh_page(self, node_id: int, limit: int, after_id: Optional[int] = None, store: bool = True) -> Dict[str, Any]:
+        """
+        Читаем одну страницу детей из БД по ключу (parent_id, id) и кладём в кэш (если `store`)
+        """
+        children = await self._fetch_from_db(node_id, limit=limit + 1, after_id=after_id)
+        page = self._slice(children, limit)
+        if not store:
+            return page
+
+        r = await get_redis()
+        key = self._PAGES_KEY_PATTERN.format(node_id=node_id)
+        await r.hset(key, f"{after_id or 0}:{limit}", json.dumps(page))
+        await r.expire(key, self._DEFAULT_TTL)
+        return page
+
+    @staticmethod
+    def _slice(children: List[Dict[str, Any]], limit: int, after_id: Optional[int] = None) -> Dict[str, Any]:
+        """children отсортированы по id"""
+        start = bisect_right(children, after_id, key=lambda item: item["id"]) if after_id else 0
+        items = children[start:start + limit]
+        has_more = len(children) > start + limit
+        return {"items": items, "next_cursor": items[-1]["id"] if has_more else None}
+
+    async def invalidate_node(self, *node_ids: int | None) -> None:
+        """
+        Удаляем данные из кэша
+        """
+        keys = []
+        for node_id in node_ids:
+            if node_id is not None:
+                keys.append(self._KEY_PATTERN.format(node_id=node_id))
+                keys.append(self._PAGES_KEY_PATTERN.format(node_id=node_id))
+        await invalidate_keys(keys)
+
+    async def _fetch_from_db(
+        self,
+        node_id: int,
+        limit: Optional[int] = None,
+        after_id: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
         async with async_session_factory() as session:
-            result = await session.execute(select(Tree).where(Tree.id == node_id))
-            node = result.scalars().first()
-            if not node:
+            if await session.scalar(select(Tree.id).where(Tree.id == node_id)) is None:
                 raise HTTPException(status_code=404, detail='Node not found')
-            
-            await self.get_tree_on_api(node.t_id, node_id, session)
-
-            result = await session.execute(select(Tree).where(Tree.parent_id == node_id).order_by(Tree.id))
-            childs = result.scalars().all()
-
-            response = []
-            if childs:
-                for child in childs:
-                    if child.is_deleted:
-                        continue
-
-                    response.append({
-                        "id": child.id,
-                        "name": child.name,
-                        "birth": child.birth if child.birth else None,
-                        "death": child.death if child.death else None,
-                        "info": bool(child.bio),  # Более читабельная проверка
-                        "untouchable": False,
-                        "mini_icon": child.mini_icon or None,  # Можно использовать `or`
-                        "main_icon": child.main_icon or None,
-                    })
-            return response
-        
-    async def get_tree_on_api(self, id: int, parent_id: int, session):
-        url = f'{self.base_url}&id={id}'
-        try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(
-                    url,
-                    headers=self.headers
-                )
-                response.raise_for_status()
-            await asyncio.sleep(1)
-            data = response.json()
-
-            new_nodes = []
-            for item in data:
-                t_id = int(item['id'])
-
-                # Проверяем, существует ли запись с таким t_id
-                existing_node = await session.execute(select(Tree).where(Tree.t_id == t_id))
-                if existing_node.scalars().first():
-                    continue  # Пропускаем, если уже есть в БД
-
-                new_node = Tree(
-                    name=item['name'],
-                    birth=item['birth_year'] if item['birth_year'] not in [None, 0] else None,
-                    death=item['death_year'] if item['death_year'] not in [None, 0] else None,
-                    parent_id=parent_id,
-                    is_deleted=False,
-                    t_id=t_id
-                )
 
-                session.add(new_node)
-                new_nodes.append(new_node)
-
-            if new_nodes:
-                await session.commit()
-            return new_nodes  # Возвращаем список добавленных узлов (может быть пустым)
-
-        except Exception as e:
-            return None  # Возвращаем None, если ошибка
+            # Только нужные колонки: bio не читаем, наличие считаем в SQL
+            stmt = (
+                select(
+                    Tree.id,
+                    Tree.name,
+                    Tree.birth,
+                    Tree.death,
+                    Tree.has_info,
+                    Tree.mini_icon,
+                    Tree.main_icon,
+                    Tree.depth,
+                    Tree.descendant_count,
+                )
+                .where(Tree.parent_id == node_id, Tree.is_deleted.isnot(True))
+                .order_by(Tree.id)
+            )
+            if after_id:
+                stmt = stmt.where(Tree.id > after_id)
+            if limit:
+                stmt = stmt.limit(limit)
+            result = await session.execute(stmt)
+            return [
+                {
+                    "id": row.id,
+                    "name": row.name,
+                    "birth": row.birth if row.birth else None,
+                    "death": row.death if row.death else None,
+                    "info": bool(row.has_info),
+                    "untouchable": False,
+                    "mini_icon": row.mini_icon or None,
+                    "main_icon": row.main_icon or None,
+                    "depth": row.depth,
+                    "descendant_count": row.descendant_count,
+                }
+                for row in result
+            ]
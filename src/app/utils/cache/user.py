@@ -1,79 +1,237 @@
 from __future__ import annotations
 import json
-from typing import Any, Dict
+from typing import Any, Dict, Iterable
+from redis.exceptions import WatchError
 from .redis import get_redis
+from .local import local_cache, invalidate_keys, drop_local_keys
+from .views import user_views
 
-from sqlalchemy import select
-from src.app.models import User, UserSubscription
+from sqlalchemy import select, true
+from src.app.config import settings
+from src.app.models import User, UserSubscription, Role, Address, Page, Tariff
 from src.app.db import async_session_factory
-from sqlalchemy.orm import selectinload
-from src.app.schemas.user import UserFull
+from src.app.schemas.user import UserBase, UserFull
+from src.app.schemas.system import RoleBase, AddressBase
+from src.app.schemas.page import PageBase
+from src.app.schemas.business import Tariff as TariffBase
 
 
 class UserCache:
+    """
+    Кэш UserFull (`user:meta:{id}`) с write-through.
+
+    Сервисы после коммита не сбрасывают кэш, а переписывают его через
+    patch()/refresh(). Каждая запись поднимает версию `user:meta:{id}:v`,
+    и промах в get_user_cache кладёт загруженное из БД только если версия
+    за время запроса не изменилась — медленный читатель не затрёт свежие данные.
+    """
+
     def __init__(self):
-        self._DEFAULT_TTL = 600
+        self._DEFAULT_TTL = settings.USER_CACHE_TTL
         self._KEY_PATTERN = "user:meta:{user_id}"
+        self._VERSION_KEY_PATTERN = "user:meta:{user_id}:v"
 
     async def get_user_cache(self, user_id: int) -> Dict[str, Any]:
         """
         Получаем актуальные данные о пользователе из Redis
         """
-        r = await get_redis()
+        user_views.hit(user_id)
         key = self._KEY_PATTERN.format(user_id=user_id)
+        if (cached := local_cache.get(key)) is not None:
+            return cached
 
-        if raw := await r.get(key):
-            return json.loads(raw)
+        generation = local_cache.generation()
+        r = await get_redis()
+        raw, version = await r.mget(key, self._VERSION_KEY_PATTERN.format(user_id=user_id))
+        if raw:
+            meta = json.loads(raw)
+            local_cache.set(key, meta, len(raw), generation)
+            return meta
 
-        meta = await self._fetch_from_db(user_id)
-        if meta:
-            await self.set_user_data_on_cache(user_id, meta.model_dump())
-            return meta.model_dump()
+        if (meta := await self._load(user_id, version, generation)) is not None:
+            return meta
 
         return {"status": False, "details": "not found"}
 
+    async def get_cached_many(self, user_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Только кэш, без БД: L1, затем один MGET в Redis на все промахи.
+        Возвращает найденных пользователей по id.
+        """
+        found: Dict[int, Dict[str, Any]] = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            key = self._KEY_PATTERN.format(user_id=user_id)
+            if (cached := local_cache.get(key)) is not None:
+                found[user_id] = cached
+            else:
+                missing.append(user_id)
+        if not missing:
+            return found
+
+        generation = local_cache.generation()
+        r = await get_redis()
+        keys = [self._KEY_PATTERN.format(user_id=user_id) for user_id in missing]
+        for user_id, key, raw in zip(missing, keys, await r.mget(keys)):
+            if raw:
+                meta = json.loads(raw)
+                local_cache.set(key, meta, len(raw), generation)
+                found[user_id] = meta
+        return found
+
     async def get_user_role(self, user_id: int) -> int:
         user = await self.get_user_cache(user_id)
         role = user['role']['id']
         return role
 
-    async def set_user_data_on_cache(self, user_id: int, meta: Dict[str, Any]):
+    async def warm(self, user_id: int) -> Dict[str, Any] | None:
         """
-        Сохраняем данные пользователя в кэш
+        Загрузка в кэш для прогрева: как промах get_user_cache, но без учёта
+        просмотра. Как и там, не перезаписывает более свежую версию.
         """
+        generation = local_cache.generation()
+        r = await get_redis()
+        version = await r.get(self._VERSION_KEY_PATTERN.format(user_id=user_id))
+        return await self._load(user_id, version, generation)
+
+    async def patch(self, user_id: int, fields: Dict[str, Any]) -> Dict[str, Any] | None:
+        """
+        Write-through после коммита: накладывает `fields` (уже в JSON-виде)
+        на закэшированный UserFull и поднимает версию одной транзакцией
+        WATCH/MULTI. Если пользователя в кэше нет, кладёт свежую копию из БД.
+        Возвращает актуальные данные пользователя.
+        """
+        r = await get_redis()
+        key = self._KEY_PATTERN.format(user_id=user_id)
+        version_key = self._VERSION_KEY_PATTERN.format(user_id=user_id)
+        async with r.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    raw = await pipe.get(key)
+                    if raw is None:
+                        await pipe.reset()
+                        return await self.refresh(user_id)
+                    meta = {**json.loads(raw), **fields}
+                    raw = json.dumps(meta)
+                    pipe.multi()
+                    pipe.set(key, raw, ex=self._DEFAULT_TTL)
+                    pipe.incr(version_key)
+                    pipe.expire(version_key, self._DEFAULT_TTL)
+                    await pipe.execute()
+                    break
+                except WatchError:
+                    # Кто-то записал между GET и EXEC — накладываем заново
+                    continue
+        await drop_local_keys([key])
+        local_cache.set(key, meta, len(raw))
+        return meta
+
+    async def refresh(self, user_id: int) -> Dict[str, Any] | None:
+        """Перечитывает пользователя из БД и записывает в кэш с новой версией."""
+        meta = await self._fetch_from_db(user_id)
+        if meta is None:
+            await self.invalidate(user_id)
+            return None
+        meta = meta.model_dump()
         r = await get_redis()
         key = self._KEY_PATTERN.format(user_id=user_id)
-        await r.set(key, json.dumps(meta), ex=self._DEFAULT_TTL)
+        version_key = self._VERSION_KEY_PATTERN.format(user_id=user_id)
+        raw = json.dumps(meta)
+        async with r.pipeline(transaction=True) as pipe:
+            pipe.set(key, raw, ex=self._DEFAULT_TTL)
+            pipe.incr(version_key)
+            pipe.expire(version_key, self._DEFAULT_TTL)
+            await pipe.execute()
+        await drop_local_keys([key])
+        local_cache.set(key, meta, len(raw))
+        return meta
 
     async def invalidate(self, user_id: int) -> None:
         """
-        Удаляем данные из кэша
+        Удаляем данные из кэша (и поднимаем версию, чтобы незаконченные
+        промахи не вернули старые данные)
+        """
+        r = await get_redis()
+        version_key = self._VERSION_KEY_PATTERN.format(user_id=user_id)
+        async with r.pipeline(transaction=True) as pipe:
+            pipe.incr(version_key)
+            pipe.expire(version_key, self._DEFAULT_TTL)
+            await pipe.execute()
+        await invalidate_keys([self._KEY_PATTERN.format(user_id=user_id)])
+
+    async def _load(self, user_id: int, version: str | None, generation: int) -> Dict[str, Any] | None:
+        """Читает пользователя из БД и кладёт в кэш, если версия всё ещё `version`."""
+        meta = await self._fetch_from_db(user_id)
+        if meta is None:
+            return None
+        meta = meta.model_dump()
+        await self._set_if_version(user_id, meta, version, generation)
+        return meta
+
+    async def _set_if_version(self, user_id: int, meta: Dict[str, Any], version: str | None, generation: int) -> None:
+        """
+        Кладёт загруженное из БД, только если с момента промаха никто не писал:
+        в Redis — по версии, в L1 — по generation() на момент промаха.
         """
         r = await get_redis()
         key = self._KEY_PATTERN.format(user_id=user_id)
-        await r.delete(key)
+        version_key = self._VERSION_KEY_PATTERN.format(user_id=user_id)
+        raw = json.dumps(meta)
+        async with r.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(version_key)
+                if await pipe.get(version_key) != version:
+                    return
+                pipe.multi()
+                pipe.set(key, raw, ex=self._DEFAULT_TTL)
+                await pipe.execute()
+            except WatchError:
+                return
+        local_cache.set(key, meta, len(raw), generation)
 
     async def _fetch_from_db(self, user_id: int) -> UserFull | None:
+        """
+        Один запрос вместо selectinload по каждой связи: роль, адрес и
+        страница — JOIN, активный тариф — LATERAL (первая активная подписка).
+        Выбираются только поля, которые есть в UserFull.
+        """
+        active_tariff = (
+            select(*(getattr(Tariff, f) for f in TariffBase.model_fields))
+            .join(UserSubscription, UserSubscription.tariff_id == Tariff.id)
+            .where(UserSubscription.user_id == User.id, UserSubscription.is_active.is_(True))
+            .order_by(UserSubscription.id)
+            .limit(1)
+            .lateral("active_tariff")
+        )
+        nested = {
+            "role": (RoleBase, Role.__table__.c),
+            "address": (AddressBase, Address.__table__.c),
+            "page": (PageBase, Page.__table__.c),
+            "tariff": (TariffBase, active_tariff.c),
+        }
+        columns = [getattr(User, f) for f in UserBase.model_fields]
+        for name, (schema, source) in nested.items():
+            columns += [source[f].label(f"{name}__{f}") for f in schema.model_fields]
+
+        stmt = (
+            select(*columns)
+            .join(Role, Role.id == User.role_id)
+            .outerjoin(Address, Address.id == User.address_id)
+            .outerjoin(Page, Page.id == User.page_id)
+            .outerjoin(active_tariff, true())
+            .where(User.id == user_id, User.is_deleted.is_(False))
+        )
         async with async_session_factory() as session:
-            stmt = (
-                select(User)
-                .where(User.id == user_id, User.is_deleted.is_(False))
-                .options(
-                    selectinload(User.role),
-                    selectinload(User.address),
-                    selectinload(User.page),
-                    selectinload(User.subscriptions).selectinload(UserSubscription.tariff)
-                )
-            )
-            user = (await session.execute(stmt)).scalar_one_or_none()
-            if not user:
-                return None
-            active_sub = next((s for s in user.subscriptions if s.is_active), None)
-            tariff = active_sub.tariff if active_sub else None
-
-            # Создаём Pydantic модель с безопасной вставкой
-            return UserFull.model_validate(
-                {**user.__dict__, "tariff": tariff},
-                from_attributes=True
-            )
+            row = (await session.execute(stmt)).mappings().first()
+        if row is None:
+            return None
 
+        data = {f: row[f] for f in UserBase.model_fields}
+        for name, (schema, _) in nested.items():
+            # id отсутствует — связи нет (LEFT JOIN)
+            data[name] = (
+                {f: row[f"{name}__{f}"] for f in schema.model_fields}
+                if row[f"{name}__id"] is not None else None
+            )
+        return UserFull.model_validate(data)
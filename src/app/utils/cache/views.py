@@ -0,0 +1,79 @@
+from __future__ import annotations
+import asyncio
+import logging
+from collections import Counter
+from typing import List, Optional
+from .redis import get_redis
+from src.app.config import settings
+
+
+class ViewCounter:
+    """
+    Счётчик популярности (Redis sorted set: member = id, score = просмотры).
+
+    hit() ничего не отправляет в Redis — просмотры копятся в памяти процесса
+    и сбрасываются одним pipeline раз в VIEWS_FLUSH_INTERVAL секунд
+    (см. ViewCounterFlusher). Раз в VIEWS_DECAY_INTERVAL все счётчики
+    делятся пополам, чтобы старая популярность постепенно забывалась.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self._pending: Counter[int] = Counter()
+
+    def hit(self, member_id: int) -> None:
+        self._pending[member_id] += 1
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, Counter()
+        r = await get_redis()
+        async with r.pipeline(transaction=False) as pipe:
+            for member_id, count in pending.items():
+                pipe.zincrby(self.key, count, str(member_id))
+            await pipe.execute()
+
+    async def decay(self) -> None:
+        r = await get_redis()
+        if await r.set(f"{self.key}:decayed", 1, nx=True, ex=settings.VIEWS_DECAY_INTERVAL):
+            await r.zunionstore(self.key, {self.key: 0.5})
+
+    async def top(self, k: int) -> List[int]:
+        r = await get_redis()
+        return [int(member) for member in await r.zrevrange(self.key, 0, k - 1)]
+
+
+tree_views = ViewCounter("tree:views")
+user_views = ViewCounter("user:views")
+
+
+class ViewCounterFlusher:
+    """Периодически сбрасывает счётчики просмотров этого процесса в Redis."""
+
+    def __init__(self, interval: float = settings.VIEWS_FLUSH_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="view-counter-flusher")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._flush()
+
+    async def _flush(self) -> None:
+        for counter in (tree_views, user_views):
+            try:
+                await counter.flush()
+                await counter.decay()
+            except Exception as e:
+                logging.error(f"View counter flush error ({counter.key}): {e}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self._flush()
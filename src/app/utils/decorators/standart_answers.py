@@ -2,6 +2,7 @@ import inspect
 from typing import Coroutine, Any, Callable
 from functools import wraps
 from fastapi import HTTPException
+from fastapi.responses import JSONResponse
 from src.app.config import settings
 
 
@@ -18,7 +19,7 @@ def standar_atatek(func: Coroutine) -> Callable[..., Coroutine[Any, Any, dict]]:
 
         except HTTPException as e:
             # если вызывается FastAPI-ошибка — возвращаем в стандартизированном формате
-            return {
+            content = {
                 "status": False,
                 "api-version": settings.APP_VERSION,
                 "error": {
@@ -26,6 +27,10 @@ def standar_atatek(func: Coroutine) -> Callable[..., Coroutine[Any, Any, dict]]:
                     "message": e.detail,
                 },
             }
+            if e.headers:
+                # 429/503 с Retry-After: заголовок и код должны дойти до клиента
+                return JSONResponse(content=content, status_code=e.status_code, headers=e.headers)
+            return content
 
         except Exception as e:
             # для всех остальных ошибок (например, RuntimeError)
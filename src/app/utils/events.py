@@ -0,0 +1,75 @@
+from __future__ import annotations
+import json
+from typing import Any, Dict, List
+from sqlalchemy import insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.app.models import TreeChange
+from .cache.redis import get_redis
+
+
+TREE_EVENTS_CHANNEL = "tree:events"
+
+
+async def record_tree_changes(db: AsyncSession, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Пишет события в журнал tree_changes в текущей транзакции и проставляет
+    каждому его `version`. Коммит остаётся за вызывающим кодом.
+    """
+    if not events:
+        return events
+    rows = [
+        {
+            "node_id": event["id"],
+            "parent_id": event.get("parent_id"),
+            "op": event["op"],
+            "data": {k: v for k, v in event.items() if k not in ("op", "id", "parent_id")} or None,
+        }
+        for event in events
+    ]
+    stmt = insert(TreeChange).returning(TreeChange.version, sort_by_parameter_order=True)
+    for event, version in zip(events, await db.scalars(stmt, rows)):
+        event["version"] = version
+    return events
+
+
+def committed_changes():
+    """
+    Условие на строки tree_changes, после которых уже не закоммитится
+    меньшая версия: транзакции с tx_id >= xmin текущего снимка ещё идут.
+    """
+    return TreeChange.tx_id < text("(pg_snapshot_xmin(pg_current_snapshot())::text)::bigint")
+
+
+async def fetch_tree_changes(db: AsyncSession, since: int, limit: int) -> List[Dict[str, Any]]:
+    """События из журнала с версией больше `since` по возрастанию версии."""
+    result = await db.execute(
+        select(TreeChange.version, TreeChange.op, TreeChange.node_id, TreeChange.parent_id, TreeChange.data)
+        .where(TreeChange.version > since, committed_changes())
+        .order_by(TreeChange.version)
+        .limit(limit)
+    )
+    return [
+        {
+            "version": row.version,
+            "op": row.op,
+            "id": row.node_id,
+            "parent_id": row.parent_id,
+            **(row.data or {}),
+        }
+        for row in result.all()
+    ]
+
+
+async def publish_tree_events(events: List[Dict[str, Any]]) -> None:
+    """
+    Рассылает изменения дерева всем процессам через Redis pub/sub.
+
+    Формат события: {"op": "insert" | "delete" | "restore" | "move",
+    "id": ..., "parent_id": ..., "version": ..., ...изменившиеся поля}.
+    `path` (и `old_path` для move) — предки узла, по ним события находят
+    подписчиков поддеревьев.
+    """
+    if not events:
+        return
+    r = await get_redis()
+    await r.publish(TREE_EVENTS_CHANNEL, json.dumps(events))
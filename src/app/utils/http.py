@@ -0,0 +1,224 @@
+from __future__ import annotations
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, Iterable, Optional
+import httpx
+from .cache.redis import get_redis
+
+
+class CircuitOpenError(httpx.HTTPError):
+    """Upstream помечен недоступным, запрос не отправлялся."""
+
+
+# Очередь слотов для запросов к upstream на все процессы: каждый вызов
+# занимает следующий свободный слот и возвращает, сколько мс до него ждать
+_RESERVE_SLOT_LUA = """
+local interval = tonumber(ARGV[1])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local slot = math.max(now, tonumber(redis.call('GET', KEYS[1]) or '0'))
+redis.call('SET', KEYS[1], slot + interval, 'PX', slot + interval - now + 1000)
+return slot - now
+"""
+
+
+class UpstreamClient:
+    """
+    Долгоживущий httpx.AsyncClient для одного внешнего сервиса:
+      - keep-alive пул с лимитом соединений на хост и HTTP/2
+      - повторы с экспоненциальной задержкой на сетевые ошибки, 429 и 5xx
+      - circuit breaker: после `failure_threshold` неудач подряд запросы
+        сразу падают с CircuitOpenError в течение `reset_timeout` секунд,
+        затем пропускается один пробный запрос, остальные падают, пока он идёт
+      - `min_interval`: не чаще одной попытки в столько секунд на все
+        процессы сразу (слоты в Redis), для upstream с лимитом частоты
+      - счётчики для мониторинга (см. stats())
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        name: str,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 10.0,
+        max_connections: int = 10,
+        retries: int = 2,
+        backoff: float = 0.2,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        retry_statuses: Optional[Iterable[int]] = None,
+        min_interval: float = 0.0,
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_statuses = set(self.RETRY_STATUSES if retry_statuses is None else retry_statuses)
+        self.min_interval = min_interval
+        self._SLOT_KEY = f"upstream:{name}:slot"
+        self.backoff = backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._client = httpx.AsyncClient(
+            headers=headers,
+            timeout=timeout,
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=60.0,
+            ),
+        )
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        # В полуоткрытом состоянии к upstream идёт только один пробный запрос
+        self._probing = False
+        self._stats = {
+            "requests": 0,
+            "errors": 0,
+            "retries": 0,
+            "short_circuited": 0,
+            "latency_total": 0.0,
+        }
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    @property
+    def max_request_time(self) -> float:
+        """Худший случай одного request(): все попытки по таймауту плюс паузы между ними."""
+        backoff = sum(self.backoff * (2 ** i) * 2 for i in range(self.retries))
+        return (self.retries + 1) * self.timeout + backoff
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def request(self, method: str, url: str, retries: Optional[int] = None, **kwargs: Any) -> httpx.Response:
+        """
+        Выполняет запрос и возвращает ответ с 2xx, иначе бросает httpx.HTTPError.
+        `retries` переопределяет число повторов для этого запроса.
+        """
+        state = self.state
+        if state == "open" or (state == "half_open" and self._probing):
+            self._stats["short_circuited"] += 1
+            raise CircuitOpenError(f"{self.name}: upstream недоступен, запрос пропущен")
+
+        probe = state == "half_open"
+        if probe:
+            self._probing = True
+        try:
+            return await self._request(method, url, probe, self.retries if retries is None else retries, **kwargs)
+        finally:
+            if probe:
+                self._probing = False
+
+    async def _request(self, method: str, url: str, probe: bool, retries: int, **kwargs: Any) -> httpx.Response:
+        attempt = 0
+        while True:
+            if self.min_interval:
+                await self._wait_for_slot()
+            self._stats["requests"] += 1
+            started = time.monotonic()
+            try:
+                response = await self._client.request(method, url, **kwargs)
+                if response.status_code in self.retry_statuses:
+                    response.raise_for_status()
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                self._stats["errors"] += 1
+                self._stats["latency_total"] += time.monotonic() - started
+                # В полуоткрытом состоянии даём только одну пробную попытку
+                if attempt >= retries or probe:
+                    self._record_failure()
+                    raise
+                attempt += 1
+                self._stats["retries"] += 1
+                logging.warning(f"{self.name}: повтор {attempt}/{retries} после ошибки: {e}")
+                delay = self.backoff * (2 ** (attempt - 1))
+                await asyncio.sleep(delay + random.uniform(0, delay))
+                continue
+
+            self._stats["latency_total"] += time.monotonic() - started
+            self._failures = 0
+            self._opened_at = None
+            response.raise_for_status()
+            return response
+
+    async def _wait_for_slot(self) -> None:
+        try:
+            r = await get_redis()
+            delay_ms = await r.eval(_RESERVE_SLOT_LUA, 1, self._SLOT_KEY, int(self.min_interval * 1000))
+        except Exception as e:
+            # Без Redis держим интервал хотя бы в этом процессе
+            logging.warning(f"{self.name}: слот в Redis не получен: {e}")
+            delay_ms = self.min_interval * 1000
+        if int(delay_ms) > 0:
+            await asyncio.sleep(int(delay_ms) / 1000)
+
+    def _record_failure(self) -> None:
+        self._failures += 1
+        if self._failures >= self.failure_threshold or self._opened_at is not None:
+            if self._opened_at is None:
+                logging.error(f"{self.name}: circuit breaker открыт после {self._failures} ошибок подряд")
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "state": self.state, "consecutive_failures": self._failures}
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+# Настройки внешних сервисов
+_UPSTREAMS: Dict[str, Dict[str, Any]] = {
+    "tumalas": {
+        "headers": {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            'Accept': 'application/json, text/javascript, */*; q=0.01',
+        },
+        "timeout": 10.0,
+        "max_connections": 10,
+    },
+    "nominatim": {
+        "headers": {
+            'User-Agent': 'Atatek Family Tree/1.0',
+        },
+        "timeout": 10.0,
+        "max_connections": 2,
+        # Политика Nominatim — не больше одного запроса в секунду на приложение,
+        # 429 не повторяем: повтор через доли секунды её бы нарушил
+        "min_interval": 1.0,
+        "retry_statuses": {500, 502, 503, 504},
+    },
+}
+
+_clients: Dict[str, UpstreamClient] = {}
+
+
+def get_http_client(name: str) -> UpstreamClient:
+    """Return shared client for upstream `name` (lazy)."""
+    if name not in _clients:
+        _clients[name] = UpstreamClient(name, **_UPSTREAMS[name])
+    return _clients[name]
+
+
+def init_http_clients() -> None:
+    for name in _UPSTREAMS:
+        get_http_client(name)
+
+
+async def close_http_clients() -> None:
+    for client in _clients.values():
+        await client.aclose()
+    _clients.clear()
+
+
+def get_http_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: client.stats() for name, client in _clients.items()}
@@ -0,0 +1,92 @@
+from __future__ import annotations
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.models import User
+from .cache.user import UserCache
+
+
+class UserLoader:
+    """
+    Пакетная загрузка кратких данных пользователей в рамках одного запроса.
+
+    Все вызовы load() в одном проходе event loop собираются в один батч:
+    id дедуплицируются, сначала берутся из UserCache (L1 + MGET), остальные —
+    одним SELECT ... WHERE id IN (...). Результаты запоминаются до конца
+    запроса, поэтому экземпляр нужно создавать на каждый запрос.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.user_cache = UserCache()
+        self._futures: Dict[int, asyncio.Future] = {}
+        self._queue: List[int] = []
+        self._tasks: Set[asyncio.Task] = set()
+
+    def load(self, user_id: Optional[int]) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        if user_id is None:
+            future = loop.create_future()
+            future.set_result(None)
+            return future
+        if user_id in self._futures:
+            return self._futures[user_id]
+
+        future = loop.create_future()
+        self._futures[user_id] = future
+        self._queue.append(user_id)
+        if len(self._queue) == 1:
+            # Задача стартует на следующем проходе loop — к этому моменту
+            # все load() текущего прохода уже в очереди
+            task = asyncio.create_task(self._dispatch())
+            self._tasks.add(task)
+            task.add_done_callback(self._dispatch_done)
+        return future
+
+    async def load_many(self, user_ids: List[Optional[int]]) -> List[Optional[Dict[str, Any]]]:
+        return list(await asyncio.gather(*(self.load(user_id) for user_id in user_ids)))
+
+    async def _dispatch(self) -> None:
+        user_ids, self._queue = self._queue, []
+        try:
+            users = await self._fetch(user_ids)
+        except asyncio.CancelledError:
+            for user_id in user_ids:
+                self._futures.pop(user_id).cancel()
+            raise
+        except Exception as e:
+            for user_id in user_ids:
+                future = self._futures.pop(user_id)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for user_id in user_ids:
+            future = self._futures[user_id]
+            if not future.done():
+                future.set_result(users.get(user_id))
+
+    def _dispatch_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"UserLoader dispatch error: {task.exception()}")
+
+    async def _fetch(self, user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        users = {
+            user_id: self._short(meta)
+            for user_id, meta in (await self.user_cache.get_cached_many(user_ids)).items()
+        }
+        missing = [user_id for user_id in user_ids if user_id not in users]
+        if missing:
+            result = await self.db.execute(
+                select(User.id, User.first_name, User.last_name).where(User.id.in_(missing))
+            )
+            users.update({row.id: self._short(row._mapping) for row in result})
+        return users
+
+    @staticmethod
+    def _short(meta) -> Dict[str, Any]:
+        return {"id": meta["id"], "first_name": meta["first_name"], "last_name": meta["last_name"]}
@@ -0,0 +1,118 @@
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Dict, Iterable
+
+from fastapi import HTTPException
+from sqlalchemy import select, or_
+
+from src.app.config import settings
+from src.app.db import async_session_factory
+from src.app.models import Page, Tree
+from .cache.redis import get_redis
+from .cache.tree import TreeCache
+from .cache.user import UserCache
+from .cache.views import tree_views, user_views
+from .sync import TreeSyncQueue
+from .sync.tree import utcnow
+
+
+class CachePrewarmer:
+    """
+    Прогрев кэшей после деплоя или сброса Redis.
+
+    Берёт top-K самых просматриваемых узлов (плюс корни всех страниц) и
+    top-K активных пользователей, кладёт в TreeCache/UserCache то, чего там
+    ещё нет, не больше `concurrency` загрузок одновременно. Узлы, которые
+    пора синхронизировать с tumalas.kz, ставятся в очередь фонового воркера.
+    """
+
+    def __init__(self, top_k: int = settings.PREWARM_TOP_K, concurrency: int = settings.PREWARM_CONCURRENCY):
+        self.top_k = top_k
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.tree_cache = TreeCache()
+        self.user_cache = UserCache()
+        self.stats = {"nodes": 0, "users": 0, "keys_loaded": 0, "already_cached": 0, "failed": 0, "sync_enqueued": 0}
+
+    async def run(self) -> Dict[str, Any]:
+        started = time.monotonic()
+        node_ids = await self._node_ids()
+        user_ids = await user_views.top(self.top_k)
+        self.stats["nodes"], self.stats["users"] = len(node_ids), len(user_ids)
+
+        await asyncio.gather(
+            *(self._warm_node(node_id) for node_id in node_ids),
+            *(self._warm_user(user_id) for user_id in user_ids),
+        )
+        await self._enqueue_stale(node_ids)
+        return {**self.stats, "seconds": round(time.monotonic() - started, 3)}
+
+    async def _node_ids(self) -> list[int]:
+        async with async_session_factory() as session:
+            page_roots = (await session.scalars(select(Page.tree_id))).all()
+        return list(dict.fromkeys([*await tree_views.top(self.top_k), *page_roots]))
+
+    async def _warm_node(self, node_id: int) -> None:
+        async with self.semaphore:
+            try:
+                if await self.tree_cache.get_cached(node_id) is not None:
+                    self.stats["already_cached"] += 1
+                    return
+                await self.tree_cache.refresh_node(node_id)
+                self.stats["keys_loaded"] += 1
+            except HTTPException:
+                # Узел удалён из БД — просто пропускаем
+                self.stats["failed"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                logging.error(f"Prewarm tree node {node_id} failed: {e}")
+
+    async def _warm_user(self, user_id: int) -> None:
+        async with self.semaphore:
+            try:
+                if await self.user_cache.get_cached_many([user_id]):
+                    self.stats["already_cached"] += 1
+                    return
+                # Не через get_user_cache — прогрев не должен считаться просмотром
+                if await self.user_cache.warm(user_id) is None:
+                    self.stats["failed"] += 1
+                    return
+                self.stats["keys_loaded"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                logging.error(f"Prewarm user {user_id} failed: {e}")
+
+    async def _enqueue_stale(self, node_ids: Iterable[int]) -> None:
+        node_ids = list(node_ids)
+        if not node_ids:
+            return
+        stale_before = utcnow() - timedelta(seconds=settings.TREE_SYNC_TTL)
+        async with async_session_factory() as session:
+            stale = (await session.scalars(
+                select(Tree.id).where(
+                    Tree.id.in_(node_ids),
+                    Tree.t_id.isnot(None),
+                    or_(Tree.synced_at.is_(None), Tree.synced_at < stale_before),
+                )
+            )).all()
+        queue = TreeSyncQueue()
+        for node_id in stale:
+            await queue.enqueue(node_id)
+        self.stats["sync_enqueued"] = len(stale)
+
+
+async def prewarm_on_startup() -> None:
+    """
+    Прогрев из lifespan. Redis общий, поэтому греет только один процесс
+    из всех запущенных — тот, кто первым взял лок.
+    """
+    r = await get_redis()
+    if not await r.set("cache:prewarm:lock", 1, nx=True, ex=60):
+        return
+    try:
+        report = await CachePrewarmer().run()
+        logging.info(f"Cache prewarm finished: {report}")
+    except Exception as e:
+        logging.error(f"Cache prewarm failed: {e}")
@@ -0,0 +1,171 @@
+from __future__ import annotations
+import asyncio
+import json
+import logging
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import select
+
+from src.app.config import settings
+from src.app.db import async_session_factory
+from src.app.models import Tree
+from .cache.redis import get_redis
+from .events import TREE_EVENTS_CHANNEL, fetch_tree_changes
+
+
+class TreeSubscriber:
+    """
+    Один клиент SSE, подписанный на поддерево узла `node_id`.
+
+    Очередь ограничена: если клиент не успевает читать, накопленное
+    выбрасывается и вместо него отправляется одно событие "resync" —
+    клиент сам догоняет через /tree/changes?since=<последняя версия>.
+    """
+
+    def __init__(self, node_id: int, max_queue: int):
+        self.node_id = node_id
+        self.queue: asyncio.Queue[Dict[str, Any]] = asyncio.Queue(maxsize=max_queue)
+
+    def push(self, event: Dict[str, Any]) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"op": "resync", "id": self.node_id})
+
+
+class TreeEventHub:
+    """
+    Раздаёт события дерева SSE-клиентам этого процесса.
+
+    На процесс — одна подписка на TREE_EVENTS_CHANNEL, дальше события
+    раскладываются по очередям клиентов, чьё поддерево они затрагивают
+    (узел или любой из его предков в `path`).
+    """
+
+    def __init__(self, max_queue: int = settings.TREE_STREAM_QUEUE_SIZE):
+        self.max_queue = max_queue
+        self._subscribers: Dict[int, Set[TreeSubscriber]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, node_id: int) -> TreeSubscriber:
+        subscriber = TreeSubscriber(node_id, self.max_queue)
+        self._subscribers.setdefault(node_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: TreeSubscriber) -> None:
+        subscribers = self._subscribers.get(subscriber.node_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[subscriber.node_id]
+
+    def dispatch(self, event: Dict[str, Any]) -> None:
+        watched = {event["id"], *event.get("path", ()), *event.get("old_path", ())}
+        public = {k: v for k, v in event.items() if k not in ("path", "old_path")}
+        for node_id in watched:
+            for subscriber in self._subscribers.get(node_id, ()):
+                subscriber.push(public)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "nodes": len(self._subscribers),
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+        }
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="tree-event-hub")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                r = await get_redis()
+                async with r.pubsub() as pubsub:
+                    await pubsub.subscribe(TREE_EVENTS_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        for event in json.loads(message["data"]):
+                            self.dispatch(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Tree event hub error: {e}")
+                # Пока подписки не было, события могли потеряться
+                for subscribers in list(self._subscribers.values()):
+                    for subscriber in subscribers:
+                        subscriber.push({"op": "resync", "id": subscriber.node_id})
+                await asyncio.sleep(1)
+
+
+tree_event_hub = TreeEventHub()
+
+
+async def missed_events(node_id: int, since: int, max_events: int = settings.TREE_STREAM_REPLAY_MAX) -> Optional[List[Dict[str, Any]]]:
+    """
+    События поддерева `node_id` из журнала после версии `since` — то, что
+    клиент пропустил, пока переподключался. Принадлежность поддереву
+    проверяется по текущим path узла (и старого родителя для move).
+    None — пропущено больше `max_events` изменений, дешевле сделать resync.
+    """
+    events = []
+    async with async_session_factory() as session:
+        while batch := await fetch_tree_changes(session, since, 500):
+            if len(events) + len(batch) > max_events:
+                return None
+            since = batch[-1]["version"]
+            ids = {e["id"] for e in batch} | {e["old_parent_id"] for e in batch if e.get("old_parent_id")}
+            paths = dict((await session.execute(select(Tree.id, Tree.path).where(Tree.id.in_(ids)))).all())
+            for event in batch:
+                watched = {event["id"], *(paths.get(event["id"]) or ())}
+                if old_parent_id := event.get("old_parent_id"):
+                    watched |= {old_parent_id, *(paths.get(old_parent_id) or ())}
+                if node_id in watched:
+                    events.append(event)
+    return events
+
+
+def _sse(event: Dict[str, Any]) -> str:
+    lines = f"id: {event['version']}\n" if "version" in event else ""
+    return f"{lines}event: tree\ndata: {json.dumps(event)}\n\n"
+
+
+async def sse_events(node_id: int, last_event_id: Optional[int] = None, heartbeat: float = settings.TREE_STREAM_HEARTBEAT):
+    """
+    Генератор тела text/event-stream. `id:` — версия из tree_changes, её
+    браузер вернёт в Last-Event-ID при переподключении: тогда сначала
+    досылаются пропущенные события из журнала, а если их слишком много —
+    одно событие "resync". Подписка живёт ровно столько, сколько генератор.
+    """
+    subscriber = tree_event_hub.subscribe(node_id)
+    try:
+        yield f"retry: 5000\nevent: ready\ndata: {json.dumps({'id': node_id})}\n\n"
+        replayed: Set[int] = set()
+        if last_event_id is not None:
+            # Подписка уже оформлена — события после журнала придут в очередь
+            missed = await missed_events(node_id, last_event_id)
+            if missed is None:
+                yield _sse({"op": "resync", "id": node_id})
+            else:
+                for event in missed:
+                    replayed.add(event["version"])
+                    yield _sse(event)
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                # Комментарий держит соединение живым через прокси
+                yield ": ping\n\n"
+                continue
+            if event.get("version") in replayed:
+                continue
+            yield _sse(event)
+    finally:
+        tree_event_hub.unsubscribe(subscriber)
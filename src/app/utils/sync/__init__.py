@@ -0,0 +1,3 @@
+from .queue import TreeSyncQueue
+from .tree import TreeSyncService
+from .worker import TreeSyncWorker
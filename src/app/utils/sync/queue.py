@@ -0,0 +1,36 @@
+from __future__ import annotations
+import time
+from typing import Optional
+from ..cache.redis import get_redis
+
+
+class TreeSyncQueue:
+    """
+    Очередь узлов дерева, ожидающих синхронизации с tumalas.kz.
+
+    Хранится в Redis как sorted set (member = node_id, score = время
+    постановки), поэтому повторная постановка того же узла не создаёт
+    дубликатов, а воркеры разных процессов делят одну очередь.
+    """
+
+    def __init__(self):
+        self._KEY = "tree:sync:queue"
+
+    async def enqueue(self, node_id: int) -> None:
+        r = await get_redis()
+        await r.zadd(self._KEY, {str(node_id): time.time()}, nx=True)
+
+    async def pop(self, timeout: int = 5) -> Optional[int]:
+        """
+        Забираем самый старый узел из очереди, ждём не дольше `timeout` секунд.
+        """
+        r = await get_redis()
+        item = await r.bzpopmin(self._KEY, timeout=timeout)
+        if not item:
+            return None
+        _, member, _ = item
+        return int(member)
+
+    async def size(self) -> int:
+        r = await get_redis()
+        return await r.zcard(self._KEY)
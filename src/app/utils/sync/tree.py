@@ -0,0 +1,211 @@
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.config import settings
+from src.app.models import Tree
+from ..http import get_http_client
+from ..cache.tree import TreeCache
+from ..cache.redis import get_redis
+from ..events import record_tree_changes, publish_tree_events
+from ..tree_counts import add_descendants
+
+
+def utcnow() -> datetime:
+    """Naive UTC, как и остальные DateTime-колонки в БД."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class TreeSyncService:
+    """
+    Подтягивает детей узла с tumalas.kz и сохраняет новые узлы в БД.
+
+    Одновременные синхронизации одного t_id схлопываются: внутри процесса
+    ожидающие делят future ведущего запроса, между процессами ведущего
+    выбирает короткий Redis-лок `tree:sync:lock:{t_id}`.
+    """
+
+    # t_id -> future ведущей синхронизации в этом процессе
+    _inflight: dict[int, asyncio.Future] = {}
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.base_url = settings.TUMALAS_BASE_URL
+        self.ttl = timedelta(seconds=settings.TREE_SYNC_TTL)
+        self.http = get_http_client("tumalas")
+        self.lock_ttl = settings.TREE_SYNC_LOCK_TTL
+        self.inline_timeout = settings.TREE_SYNC_INLINE_TIMEOUT
+        self._LOCK_KEY_PATTERN = "tree:sync:lock:{t_id}"
+
+    def is_stale(self, node: Tree) -> bool:
+        return node.synced_at is None or node.synced_at < utcnow() - self.ttl
+
+    async def fetch_children(self, t_id: int, inline: bool = False) -> list[dict]:
+        """
+        Сырые данные о детях узла с tumalas.kz. `inline` — вызов из запроса
+        пользователя: одна попытка, не дольше inline_timeout.
+        """
+        url = f'{self.base_url}&id={t_id}'
+        if inline:
+            response = await asyncio.wait_for(self.http.get(url, retries=0), self.inline_timeout)
+        else:
+            response = await self.http.get(url)
+        return response.json()
+
+    async def save_children(self, node: Tree, data: list[dict]) -> list[Tree]:
+        """
+        Сохраняет детей узла одним INSERT ... ON CONFLICT (t_id) DO NOTHING.
+        Уже известные t_id пропускаются, RETURNING отдаёт только новые узлы,
+        на их число растут descendant_count узла и его предков.
+        Коммит остаётся за вызывающим кодом.
+        """
+        path = node.child_path
+        rows = [
+            {
+                "name": item['name'],
+                "birth": item['birth_year'] if item['birth_year'] not in [None, 0] else None,
+                "death": item['death_year'] if item['death_year'] not in [None, 0] else None,
+                "parent_id": node.id,
+                "path": path,
+                "depth": len(path),
+                "is_deleted": False,
+                "t_id": int(item['id']),
+                "created_by": 1,
+            }
+            for item in data
+        ]
+        if not rows:
+            return []
+
+        stmt = (
+            insert(Tree)
+            .on_conflict_do_nothing(index_elements=[Tree.t_id])
+            .returning(Tree)
+        )
+        new_nodes = list(await self.db.scalars(stmt, rows))
+        await add_descendants(self.db, path, len(new_nodes))
+        return new_nodes
+
+    async def sync_node(self, node: Tree, inline: bool = False) -> list[Tree] | None:
+        """
+        Синхронизирует прямых детей узла.
+        Возвращает список добавленных узлов или None, если upstream недоступен.
+        `inline` — см. fetch_children.
+        Если тот же t_id уже синхронизирует кто-то другой, дожидается его и
+        возвращает [] (или None, если у ведущего не вышло) — дети к этому
+        моменту уже в БД. Перед ожиданием транзакция сессии закрывается.
+        Вызов из запроса (`inline`) ведущего не ждёт и сразу возвращает None —
+        клиент получит текущее состояние БД, а новых детей ему доставят
+        инвалидация кэша и SSE-событие ведущего.
+        """
+        t_id = node.t_id
+        if (leader := self._inflight.get(t_id)) is not None:
+            # Не держим соединение из пула, пока ждём чужой запрос
+            await self.db.rollback()
+            if inline:
+                return None
+            return [] if await asyncio.shield(leader) else None
+
+        leader = asyncio.get_running_loop().create_future()
+        self._inflight[t_id] = leader
+        ok = False
+        try:
+            new_nodes = await self._sync_with_lock(node, inline)
+            ok = new_nodes is not None
+            return new_nodes
+        finally:
+            self._inflight.pop(t_id, None)
+            leader.set_result(ok)
+
+    async def _sync_with_lock(self, node: Tree, inline: bool = False) -> list[Tree] | None:
+        node_id, t_id, synced_before = node.id, node.t_id, node.synced_at
+        r = await get_redis()
+        lock = r.lock(self._LOCK_KEY_PATTERN.format(t_id=t_id), timeout=self.lock_ttl, blocking=False)
+        if not await lock.acquire():
+            await self.db.rollback()
+            if inline:
+                return None
+            if not await self._wait_for_lock(lock.name):
+                return None
+            # Лок пропал — но ведущий мог упасть или не успеть до TTL,
+            # поэтому смотрим, записал ли он результат
+            synced_at = await self.db.scalar(select(Tree.synced_at).where(Tree.id == node_id))
+            if synced_at is not None and synced_at != synced_before:
+                return []
+            if not await lock.acquire():
+                return None
+
+        # Пока идёт синхронизация, продлеваем лок — повторы запроса к
+        # upstream могут длиться дольше его TTL
+        keepalive = asyncio.create_task(self._keep_lock(lock))
+        try:
+            return await self._sync_node(node_id, t_id, inline)
+        finally:
+            keepalive.cancel()
+            await asyncio.gather(keepalive, return_exceptions=True)
+            try:
+                await lock.release()
+            except Exception:
+                # Лок истёк по TTL — его мог забрать другой процесс
+                pass
+
+    async def _keep_lock(self, lock) -> None:
+        while True:
+            await asyncio.sleep(self.lock_ttl / 3)
+            await lock.reacquire()
+
+    async def _wait_for_lock(self, key: str) -> bool:
+        """
+        Ждём, пока ведущий процесс отпустит лок. Живой ведущий продлевает его,
+        упавший перестаёт — тогда ключ истечёт через lock_ttl. False — не дождались.
+        """
+        r = await get_redis()
+        deadline = time.monotonic() + self.http.max_request_time + self.lock_ttl
+        while time.monotonic() < deadline:
+            if not await r.exists(key):
+                return True
+            await asyncio.sleep(0.05)
+        return False
+
+    async def _sync_node(self, node_id: int, t_id: int, inline: bool = False) -> list[Tree] | None:
+        try:
+            # Соединение из пула не держим, пока ждём upstream: транзакцию
+            # закрываем, а узел перечитываем уже в новой, под запись
+            await self.db.rollback()
+            data = await self.fetch_children(t_id, inline)
+            node = await self.db.get(Tree, node_id, populate_existing=True)
+            if node is None:
+                return []
+            new_nodes = await self.save_children(node, data)
+            node.synced_at = utcnow()
+            lineage = node.child_path
+            events = await record_tree_changes(self.db, [
+                {
+                    "op": "insert",
+                    "id": n.id,
+                    "parent_id": n.parent_id,
+                    "depth": n.depth,
+                    "name": n.name,
+                    "birth": n.birth,
+                    "death": n.death,
+                }
+                for n in new_nodes
+            ])
+            for event in events:
+                event["path"] = lineage
+            await self.db.commit()
+            if new_nodes:
+                # Новые дети узла и выросшие descendant_count у предков
+                await TreeCache().invalidate_node(*lineage)
+                await publish_tree_events(events)
+            return new_nodes
+
+        except Exception as e:
+            await self.db.rollback()
+            logging.error(f"Ошибка при запросе дерева: {e}")
+            return None
@@ -0,0 +1,56 @@
+from __future__ import annotations
+import asyncio
+import logging
+
+from src.app.db import async_session_factory
+from src.app.models import Tree
+from .queue import TreeSyncQueue
+from .tree import TreeSyncService
+
+
+class TreeSyncWorker:
+    """
+    Пул фоновых задач, разбирающих TreeSyncQueue.
+    Запускается в lifespan приложения, по одному пулу на процесс uvicorn.
+    """
+
+    def __init__(self, concurrency: int = 2, delay: float = 0.1):
+        self.concurrency = concurrency
+        self.delay = delay  # пауза между запросами, чтобы не перегружать tumalas.kz
+        self.queue = TreeSyncQueue()
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        for i in range(self.concurrency):
+            self._tasks.append(asyncio.create_task(self._run(), name=f"tree-sync-{i}"))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                node_id = await self.queue.pop()
+                if node_id is None:
+                    continue
+                await self.process(node_id)
+                await asyncio.sleep(self.delay)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Tree sync worker error: {e}")
+                await asyncio.sleep(1)
+
+    async def process(self, node_id: int) -> None:
+        async with async_session_factory() as session:
+            node = await session.get(Tree, node_id)
+            if not node or node.t_id is None:
+                return
+            service = TreeSyncService(session)
+            # Узел мог успеть синхронизироваться, пока лежал в очереди
+            if not service.is_stale(node):
+                return
+            await service.sync_node(node)
@@ -0,0 +1,85 @@
+"""
+Поддержка Tree.descendant_count — числа видимых потомков узла.
+
+Мягко удалённый узел скрывает всё своё поддерево: его потомки не входят в
+счётчики предков выше него, но его собственный счётчик продолжает их
+учитывать — так восстановление узла сводится к одному сложению.
+"""
+from __future__ import annotations
+from typing import Dict, List
+
+from sqlalchemy import select, update, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.models import Tree
+
+
+async def visible_chain(db: AsyncSession, lineage: List[int]) -> List[int]:
+    """
+    Часть линии (path + id узла) от самого глубокого удалённого узла
+    (включительно) до конца — именно эти узлы видят изменения ниже.
+    """
+    if not lineage:
+        return []
+    deepest_deleted = await db.scalar(
+        select(func.max(Tree.depth)).where(Tree.id.in_(lineage), Tree.is_deleted.is_(True))
+    )
+    return lineage[deepest_deleted or 0:]
+
+
+async def add_descendants(db: AsyncSession, lineage: List[int], delta: int) -> None:
+    """
+    Прибавляет `delta` к descendant_count узлов линии, которые видят
+    изменение. Коммит остаётся за вызывающим кодом.
+    """
+    if not delta:
+        return
+    chain = await visible_chain(db, lineage)
+    if chain:
+        await db.execute(
+            update(Tree)
+            .where(Tree.id.in_(chain))
+            .values(descendant_count=Tree.descendant_count + delta)
+            .execution_options(synchronize_session=False)
+        )
+
+
+async def recompute_tree_counts(db: AsyncSession) -> Dict[str, int]:
+    """
+    Полный пересчёт path/depth (сверху вниз по parent_id) и
+    descendant_count (снизу вверх, по одному UPDATE на поколение).
+    """
+    fixed_paths = await db.execute(text(
+        """
+        WITH RECURSIVE walk AS (
+            SELECT id, ARRAY[]::integer[] AS path FROM tree WHERE parent_id IS NULL
+            UNION ALL
+            SELECT t.id, walk.path || t.parent_id
+            FROM tree t JOIN walk ON t.parent_id = walk.id
+        )
+        UPDATE tree SET path = walk.path, depth = cardinality(walk.path)
+        FROM walk
+        WHERE tree.id = walk.id AND (tree.path <> walk.path OR tree.depth <> cardinality(walk.path))
+        """
+    ))
+
+    max_depth = await db.scalar(select(func.coalesce(func.max(Tree.depth), 0)))
+    await db.execute(text("UPDATE tree SET descendant_count = 0 WHERE descendant_count <> 0"))
+    for depth in range(max_depth - 1, -1, -1):
+        await db.execute(
+            text(
+                """
+                UPDATE tree SET descendant_count = sub.total
+                FROM (
+                    SELECT parent_id, SUM(1 + descendant_count) AS total
+                    FROM tree
+                    WHERE depth = :child_depth AND is_deleted IS NOT TRUE
+                    GROUP BY parent_id
+                ) sub
+                WHERE tree.id = sub.parent_id
+                """
+            ),
+            {"child_depth": depth + 1},
+        )
+    await db.commit()
+    return {"fixed_paths": fixed_paths.rowcount, "max_depth": max_depth}
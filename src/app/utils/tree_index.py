@@ -0,0 +1,391 @@
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, func
+
+from src.app.db import async_session_factory
+from src.app.models import Tree, TreeChange
+from .cache.redis import get_redis
+from .events import TREE_EVENTS_CHANNEL, committed_changes, fetch_tree_changes
+
+
+class TreeIndex:
+    """
+    Компактный in-memory индекс структуры дерева.
+
+    Все данные лежат в плоских array('i'), индекс массива = Tree.id:
+      - parent / depth / size (число потомков, включая мягко удалённых)
+      - child_start + children — дети в формате CSR на момент загрузки
+    Узлы, добавленные или перенесённые после загрузки, дописываются в
+    `_extra`, а устаревшие записи CSR отфильтровываются по `parent`.
+    На миллион узлов уходит порядка 25 MB.
+
+    `version` — версия журнала tree_changes, которой соответствуют загруженные
+    данные (хранится и в снимке). replay() догоняет индекс по журналу от неё.
+    """
+
+    _MAGIC = b"TIDX2"
+
+    def __init__(self):
+        self.loaded = False
+        self.loaded_at: Optional[float] = None
+        self.version = 0
+        self._clear()
+
+    def _clear(self) -> None:
+        self._parent = array("i")
+        self._depth = array("i")
+        self._size = array("i")
+        self._child_start = array("i", [0])
+        self._children = array("i")
+        self._present = bytearray()
+        self._deleted = bytearray()
+        self._extra: Dict[int, List[int]] = {}
+        # Версии, применённые через replay(): те же события ещё могут
+        # прийти из pub/sub, повторно их применять нельзя
+        self._replayed: set[int] = set()
+
+    # ---------- построение ----------
+
+    def build(self, rows: Iterable[Tuple[int, Optional[int], int, Optional[bool]]]) -> None:
+        """rows: (id, parent_id, depth, is_deleted)"""
+        rows = list(rows)
+        self._allocate(max((row[0] for row in rows), default=-1) + 1)
+        self._put(rows)
+        self._finish()
+
+    async def load_from_db(self, batch_size: int = 10000) -> None:
+        """
+        Массивы выделяются заранее по max(id), строки раскладываются в них
+        по мере чтения пачками — весь результат в памяти не собирается.
+        """
+        async with async_session_factory() as session:
+            # Версия журнала и строки дерева — из одного снимка БД
+            await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+            version = await session.scalar(
+                select(func.coalesce(func.max(TreeChange.version), 0)).where(committed_changes())
+            )
+            max_id = await session.scalar(select(func.max(Tree.id)))
+            self._allocate((max_id or 0) + 1)
+            result = await session.stream(
+                select(Tree.id, Tree.parent_id, Tree.depth, Tree.is_deleted)
+                .execution_options(yield_per=batch_size)
+            )
+            async for partition in result.partitions():
+                self._put(partition)
+        self._finish()
+        self.version = version
+
+    async def replay(self, batch_size: int = 1000) -> int:
+        """
+        Применяет события журнала новее `version` — изменения, сделанные
+        после снимка или во время загрузки. Возвращает их число.
+        """
+        applied = 0
+        since = max([self.version, *self._replayed])
+        async with async_session_factory() as session:
+            while events := await fetch_tree_changes(session, since, batch_size):
+                for event in events:
+                    self.apply_event(event)
+                    self._replayed.add(event["version"])
+                since = events[-1]["version"]
+                applied += len(events)
+        return applied
+
+    def _allocate(self, n: int) -> None:
+        self._clear()
+        self.loaded = False
+        self.version = 0
+        self._parent = array("i", [-1]) * n
+        self._depth = array("i", [0]) * n
+        self._size = array("i", [0]) * n
+        self._present = bytearray(n)
+        self._deleted = bytearray(n)
+
+    def _put(self, rows: Iterable[Tuple[int, Optional[int], int, Optional[bool]]]) -> None:
+        # Узлы, созданные после SELECT max(id), дорастят массивы
+        for node_id, parent_id, depth, is_deleted in rows:
+            self._ensure(node_id)
+            self._parent[node_id] = parent_id if parent_id is not None else -1
+            self._depth[node_id] = depth
+            self._present[node_id] = 1
+            self._deleted[node_id] = 1 if is_deleted else 0
+
+    def _finish(self) -> None:
+        n = len(self._parent)
+        present = self._present
+        self._build_csr()
+
+        # Размеры поддеревьев — снизу вверх по глубине; порядок по глубине
+        # получаем сортировкой подсчётом в ещё один массив
+        max_depth = max((self._depth[node_id] for node_id in range(n) if present[node_id]), default=0)
+        by_depth = array("i", [0]) * (max_depth + 2)
+        for node_id in range(n):
+            if present[node_id]:
+                by_depth[self._depth[node_id] + 1] += 1
+        for d in range(1, max_depth + 2):
+            by_depth[d] += by_depth[d - 1]
+        order = array("i", [0]) * by_depth[max_depth + 1]
+        for node_id in range(n):
+            if present[node_id]:
+                d = self._depth[node_id]
+                order[by_depth[d]] = node_id
+                by_depth[d] += 1
+        for node_id in reversed(order):
+            p = self._parent[node_id]
+            if p >= 0:
+                self._size[p] += self._size[node_id] + 1
+
+        self.loaded = True
+        self.loaded_at = time.time()
+
+    def _build_csr(self) -> None:
+        """Раскладывает детей по текущим `parent` в CSR; `_extra` после этого пуст."""
+        n = len(self._parent)
+        present = self._present
+
+        # Считаем детей, префиксные суммы, раскладываем
+        counts = array("i", [0]) * (n + 1)
+        for node_id in range(n):
+            p = self._parent[node_id]
+            if present[node_id] and p >= 0:
+                counts[p + 1] += 1
+        for i in range(1, n + 1):
+            counts[i] += counts[i - 1]
+        self._child_start = array("i", counts)
+        self._children = array("i", [0]) * counts[n]
+        fill = counts
+        for node_id in range(n):
+            p = self._parent[node_id]
+            if present[node_id] and p >= 0:
+                self._children[fill[p]] = node_id
+                fill[p] += 1
+        self._extra = {}
+
+    def save_snapshot(self, path: str) -> None:
+        if self._extra or len(self._child_start) != len(self._parent) + 1:
+            # После инкрементальных событий CSR не покрывает новые узлы и
+            # переносы — перекладываем, иначе снимок будет несогласованным
+            self._build_csr()
+        # Свой временный файл у каждого процесса: воркеры uvicorn пишут снимок
+        # одновременно, а os.replace атомарно подменяет готовый файл
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(self._MAGIC)
+                f.write(struct.pack("<qqq", len(self._parent), len(self._children), self.version))
+                for arr in (self._parent, self._depth, self._size, self._child_start, self._children):
+                    arr.tofile(f)
+                f.write(self._present)
+                f.write(self._deleted)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def load_snapshot(self, path: str) -> None:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:len(self._MAGIC)] != self._MAGIC:
+                raise ValueError(f"{path} is not a tree index snapshot")
+            offset = len(self._MAGIC)
+            n, m, version = struct.unpack_from("<qqq", mm, offset)
+            offset += 24
+
+            def take(count: int, typecode: str = "i") -> array:
+                nonlocal offset
+                arr = array(typecode)
+                nbytes = count * arr.itemsize
+                arr.frombytes(mm[offset:offset + nbytes])
+                offset += nbytes
+                return arr
+
+            self._clear()
+            self._parent = take(n)
+            self._depth = take(n)
+            self._size = take(n)
+            self._child_start = take(n + 1)
+            self._children = take(m)
+            self._present = bytearray(mm[offset:offset + n])
+            self._deleted = bytearray(mm[offset + n:offset + 2 * n])
+        self.version = version
+        self.loaded = True
+        self.loaded_at = os.path.getmtime(path)
+
+    # ---------- запросы ----------
+
+    def has(self, node_id: int) -> bool:
+        return 0 <= node_id < len(self._present) and self._present[node_id] == 1
+
+    def parent(self, node_id: int) -> Optional[int]:
+        p = self._parent[node_id] if self.has(node_id) else -1
+        return p if p >= 0 else None
+
+    def depth(self, node_id: int) -> int:
+        return self._depth[node_id]
+
+    def is_deleted(self, node_id: int) -> bool:
+        return self._deleted[node_id] == 1
+
+    def ancestors(self, node_id: int) -> List[int]:
+        """id предков от корня до родителя."""
+        chain = []
+        p = self.parent(node_id)
+        while p is not None:
+            chain.append(p)
+            p = self.parent(p)
+        chain.reverse()
+        return chain
+
+    def children(self, node_id: int) -> List[int]:
+        result = []
+        if node_id + 1 < len(self._child_start):
+            for c in self._children[self._child_start[node_id]:self._child_start[node_id + 1]]:
+                if self._parent[c] == node_id:
+                    result.append(c)
+        result.extend(c for c in self._extra.get(node_id, ()) if self._parent[c] == node_id)
+        # Узел, перенесённый туда и обратно, есть и в CSR, и в _extra
+        return list(dict.fromkeys(result))
+
+    def siblings(self, node_id: int) -> List[int]:
+        p = self.parent(node_id)
+        if p is None:
+            return []
+        return [c for c in self.children(p) if c != node_id]
+
+    def subtree_size(self, node_id: int) -> int:
+        """Число всех потомков узла (включая мягко удалённых)."""
+        return self._size[node_id] if self.has(node_id) else 0
+
+    # ---------- инкрементальные обновления ----------
+
+    def _ensure(self, node_id: int) -> None:
+        grow = node_id + 1 - len(self._parent)
+        if grow > 0:
+            self._parent.extend(array("i", [-1]) * grow)
+            self._depth.extend(array("i", [0]) * grow)
+            self._size.extend(array("i", [0]) * grow)
+            self._present.extend(bytes(grow))
+            self._deleted.extend(bytes(grow))
+
+    def _add_to_ancestors(self, node_id: int, delta: int) -> None:
+        p = self.parent(node_id)
+        while p is not None:
+            self._size[p] += delta
+            p = self.parent(p)
+
+    def apply_event(self, event: Dict[str, Any]) -> None:
+        version = event.get("version")
+        if version is not None and (version <= self.version or version in self._replayed):
+            # Уже учтено при загрузке или в replay()
+            return
+        op, node_id = event["op"], event["id"]
+        if op == "insert":
+            if self.has(node_id):
+                return
+            self._ensure(node_id)
+            parent_id = event.get("parent_id")
+            self._parent[node_id] = parent_id if parent_id is not None else -1
+            self._depth[node_id] = event.get("depth", 0)
+            self._present[node_id] = 1
+            if parent_id is not None:
+                self._extra.setdefault(parent_id, []).append(node_id)
+            self._add_to_ancestors(node_id, 1)
+        elif op in ("delete", "restore"):
+            if self.has(node_id):
+                self._deleted[node_id] = 1 if op == "delete" else 0
+        elif op == "move":
+            if not self.has(node_id) or self._parent[node_id] == event["parent_id"]:
+                return
+            moved = self._size[node_id] + 1
+            self._add_to_ancestors(node_id, -moved)
+            new_parent = event["parent_id"]
+            self._parent[node_id] = new_parent
+            self._extra.setdefault(new_parent, []).append(node_id)
+            self._add_to_ancestors(node_id, moved)
+            # Пересчитываем глубину всего перенесённого поддерева
+            stack = [(node_id, self._depth[new_parent] + 1)]
+            while stack:
+                current, depth = stack.pop()
+                self._depth[current] = depth
+                stack.extend((c, depth + 1) for c in self.children(current))
+
+
+tree_index = TreeIndex()
+
+
+class TreeIndexUpdater:
+    """
+    Загружает tree_index при старте и держит его в актуальном состоянии по
+    событиям из TREE_EVENTS_CHANNEL. После загрузки (из снимка или из БД)
+    индекс догоняется по журналу tree_changes — иначе переносы и удаления,
+    сделанные после снимка, потерялись бы. Если подписка рвалась, индекс
+    перезагружается из БД.
+    """
+
+    def __init__(self, snapshot_path: Optional[str] = None):
+        self.snapshot_path = snapshot_path
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="tree-index-updater")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _load(self, use_snapshot: bool) -> None:
+        started = time.monotonic()
+        source = None
+        if use_snapshot and self.snapshot_path and os.path.exists(self.snapshot_path):
+            try:
+                tree_index.load_snapshot(self.snapshot_path)
+                source = "snapshot"
+            except (ValueError, struct.error) as e:
+                logging.warning(f"Tree index snapshot ignored: {e}")
+        if source is None:
+            await tree_index.load_from_db()
+            source = "db"
+            if self.snapshot_path:
+                tree_index.save_snapshot(self.snapshot_path)
+        # Пока индекс не догнал журнал, запросы идут в БД
+        tree_index.loaded = False
+        replayed = await tree_index.replay()
+        tree_index.loaded = True
+        logging.info(
+            f"Tree index loaded from {source} in {time.monotonic() - started:.2f}s "
+            f"(version {tree_index.version}, replayed {replayed} changes)"
+        )
+
+    async def _run(self) -> None:
+        first = True
+        while True:
+            try:
+                r = await get_redis()
+                async with r.pubsub() as pubsub:
+                    # Сначала подписка, потом загрузка — так события,
+                    # пришедшие во время загрузки, не теряются
+                    await pubsub.subscribe(TREE_EVENTS_CHANNEL)
+                    await self._load(use_snapshot=first)
+                    first = False
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        for event in json.loads(message["data"]):
+                            tree_index.apply_event(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Tree index updater error: {e}")
+                tree_index.loaded = False
+                await asyncio.sleep(5)
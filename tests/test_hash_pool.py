@@ -0,0 +1,95 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from src.app.utils.auth import HashPool
+
+
+async def settle(pool: HashPool) -> None:
+    # Учёт завершения приходит из потока через call_soon_threadsafe
+    for _ in range(100):
+        if pool.stats()["pending"] == 0:
+            return
+        await asyncio.sleep(0.01)
+
+
+def test_admission_limit():
+    async def main():
+        pool = HashPool(workers=1, max_queue=1)
+        release = threading.Event()
+        running = asyncio.create_task(pool.run(release.wait))
+        queued = asyncio.create_task(pool.run(lambda: "queued"))
+        await asyncio.sleep(0)
+
+        with pytest.raises(HTTPException) as exc:
+            await pool.run(lambda: "rejected")
+        assert exc.value.status_code == 503
+        assert exc.value.headers == {"Retry-After": "1"}
+
+        release.set()
+        assert await running is True
+        assert await queued == "queued"
+        await settle(pool)
+        pool.shutdown()
+        return pool.stats()
+
+    stats = asyncio.run(main())
+    assert stats["completed"] == 2
+    assert stats["rejected"] == 1
+    assert stats["pending"] == 0
+
+
+def test_failed_job_is_counted():
+    def boom():
+        raise ValueError("boom")
+
+    async def main():
+        pool = HashPool(workers=1, max_queue=0)
+        with pytest.raises(ValueError):
+            await pool.run(boom)
+        await settle(pool)
+        pool.shutdown()
+        return pool.stats()
+
+    stats = asyncio.run(main())
+    assert stats["failed"] == 1
+    assert stats["completed"] == 0
+    assert stats["pending"] == 0
+
+
+def test_cancelled_caller_keeps_slot_until_thread_finishes():
+    async def main():
+        pool = HashPool(workers=1, max_queue=1)
+        release = threading.Event()
+        started = threading.Event()
+
+        def work():
+            started.set()
+            release.wait()
+
+        running = asyncio.create_task(pool.run(work))
+        queued = asyncio.create_task(pool.run(lambda: "never"))
+        await asyncio.to_thread(started.wait)
+
+        # Клиент отвалился: корутины отменены, но хеш в потоке ещё считается
+        running.cancel()
+        queued.cancel()
+        await asyncio.gather(running, queued, return_exceptions=True)
+        await asyncio.sleep(0.05)
+        during = pool.stats()
+
+        release.set()
+        await settle(pool)
+        pool.shutdown()
+        return during, pool.stats()
+
+    during, after = asyncio.run(main())
+    # Запущенная задача держит место, пока поток не закончил,
+    # задача из очереди отменена до старта и место освободила
+    assert during["pending"] == 1
+    assert during["cancelled"] == 1
+    assert after["pending"] == 0
+    assert after["completed"] == 1
+    assert after["cancelled"] == 1
@@ -0,0 +1,85 @@
+from src.app.utils.cache import local as local_module
+from src.app.utils.cache.local import LocalCache
+
+
+def test_evicts_least_recently_used_by_count():
+    cache = LocalCache(max_entries=2, max_bytes=1000, ttl=60)
+    cache.set("a", 1, 10)
+    cache.set("b", 2, 10)
+    assert cache.get("a") == 1
+    cache.set("c", 3, 10)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_evicts_by_total_size():
+    cache = LocalCache(max_entries=10, max_bytes=100, ttl=60)
+    cache.set("a", 1, 40)
+    cache.set("b", 2, 40)
+    cache.set("c", 3, 40)
+    assert cache.get("a") is None
+    assert len(cache) == 2
+
+    # Перезапись ключа не считает старый размер дважды
+    cache.set("c", 4, 60)
+    assert cache.get("b") == 2
+    assert cache.get("c") == 4
+
+
+def test_skips_oversized_and_disabled():
+    cache = LocalCache(max_entries=10, max_bytes=100, ttl=60)
+    cache.set("big", 1, 101)
+    assert cache.get("big") is None
+
+    disabled = LocalCache(max_entries=0, max_bytes=100, ttl=60)
+    disabled.set("a", 1, 1)
+    assert len(disabled) == 0
+
+
+def test_expires_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(local_module.time, "monotonic", lambda: now[0])
+    cache = LocalCache(max_entries=10, max_bytes=100, ttl=5)
+    cache.set("a", 1, 10)
+    now[0] += 4
+    assert cache.get("a") == 1
+    now[0] += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_set_skips_key_invalidated_during_read():
+    cache = LocalCache(max_entries=10, max_bytes=100, ttl=60)
+    generation = cache.generation()
+    # Пока читатель ждал Redis, пришла инвалидация этого ключа
+    cache.invalidate("a")
+    cache.set("a", "stale", 10, generation)
+    assert cache.get("a") is None
+
+    # Инвалидация другого ключа не мешает
+    cache.set("b", "fresh", 10, generation)
+    assert cache.get("b") == "fresh"
+
+    # Читатель, начавший после инвалидации, кладёт значение
+    cache.set("a", "fresh", 10, cache.generation())
+    assert cache.get("a") == "fresh"
+
+
+def test_set_skips_after_clear_and_forgotten_invalidations():
+    cache = LocalCache(max_entries=10, max_bytes=100, ttl=60)
+    generation = cache.generation()
+    cache.clear()
+    cache.set("a", 1, 10, generation)
+    assert cache.get("a") is None
+
+    cache.MAX_TRACKED_INVALIDATIONS = 2
+    generation = cache.generation()
+    for key in ("x", "y", "z"):
+        cache.invalidate(key)
+    # Инвалидация "x" уже забыта — значит, её могло касаться любое чтение
+    cache.set("x", 1, 10, generation)
+    cache.set("other", 1, 10, generation)
+    assert cache.get("x") is None
+    assert cache.get("other") is None
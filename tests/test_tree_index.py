@@ -0,0 +1,112 @@
+from src.app.utils.tree_index import TreeIndex
+
+
+# (id, parent_id, depth, is_deleted)
+#   1
+#   ├── 2
+#   │   └── 4
+#   └── 3
+ROWS = [
+    (1, None, 0, False),
+    (2, 1, 1, False),
+    (3, 1, 1, False),
+    (4, 2, 2, True),
+]
+
+
+def build() -> TreeIndex:
+    index = TreeIndex()
+    index.build(ROWS)
+    return index
+
+
+def state(index: TreeIndex, ids) -> dict:
+    return {
+        node_id: (index.parent(node_id), index.depth(node_id), index.subtree_size(node_id), index.children(node_id))
+        for node_id in ids
+    }
+
+
+def test_build():
+    index = build()
+    assert index.children(1) == [2, 3]
+    assert index.ancestors(4) == [1, 2]
+    assert index.siblings(2) == [3]
+    assert index.subtree_size(1) == 3
+    assert index.is_deleted(4)
+    assert not index.has(5)
+
+
+def test_apply_insert_and_move():
+    index = build()
+    index.apply_event({"op": "insert", "id": 5, "parent_id": 4, "depth": 3, "version": 1})
+    assert index.children(4) == [5]
+    assert index.subtree_size(1) == 4
+
+    index.apply_event({"op": "move", "id": 2, "parent_id": 3, "version": 2})
+    assert index.children(1) == [3]
+    assert index.children(3) == [2]
+    assert index.ancestors(5) == [1, 3, 2, 4]
+    assert index.depth(5) == 4
+    assert index.subtree_size(3) == 3
+    assert index.subtree_size(1) == 4
+
+    # Перенос обратно: узел есть и в CSR, и в _extra, но отдаётся один раз
+    index.apply_event({"op": "move", "id": 2, "parent_id": 1, "version": 3})
+    assert index.children(1) == [2, 3]
+    assert index.depth(5) == 3
+
+
+def test_apply_delete_restore():
+    index = build()
+    index.apply_event({"op": "delete", "id": 3, "version": 1})
+    assert index.is_deleted(3)
+    index.apply_event({"op": "restore", "id": 3, "version": 2})
+    assert not index.is_deleted(3)
+
+
+def test_apply_event_skips_seen_versions():
+    index = build()
+    index.version = 10
+    index.apply_event({"op": "insert", "id": 5, "parent_id": 1, "depth": 1, "version": 10})
+    assert not index.has(5)
+
+    index.apply_event({"op": "insert", "id": 5, "parent_id": 1, "depth": 1, "version": 11})
+    index.apply_event({"op": "insert", "id": 6, "parent_id": 5, "depth": 2, "version": 12})
+    # Повторная доставка переноса не должна дважды менять размеры
+    move = {"op": "move", "id": 6, "parent_id": 3, "version": 13}
+    index.apply_event(move)
+    index.apply_event(move)
+    assert index.subtree_size(5) == 0
+    assert index.subtree_size(3) == 1
+    assert index.subtree_size(1) == 5
+
+
+def test_snapshot_round_trip(tmp_path):
+    index = build()
+    # Снимок после инкрементальных событий: новые узлы и переносы
+    # живут вне CSR и должны попасть в файл
+    index.apply_event({"op": "insert", "id": 7, "parent_id": 3, "depth": 2, "version": 5})
+    index.apply_event({"op": "move", "id": 2, "parent_id": 3, "version": 6})
+    index.version = 6
+    path = str(tmp_path / "tree.idx")
+    index.save_snapshot(path)
+
+    restored = TreeIndex()
+    restored.load_snapshot(path)
+    ids = [1, 2, 3, 4, 7]
+    assert state(restored, ids) == state(index, ids)
+    assert restored.version == 6
+    assert restored.children(3) == [2, 7]
+    assert restored.is_deleted(4)
+    assert list(tmp_path.iterdir()) == [tmp_path / "tree.idx"]
+
+
+def test_load_snapshot_rejects_foreign_file(tmp_path):
+    path = tmp_path / "tree.idx"
+    path.write_bytes(b"TIDX1" + bytes(64))
+    try:
+        TreeIndex().load_snapshot(str(path))
+    except ValueError:
+        return
+    raise AssertionError("old snapshot format must be rejected")
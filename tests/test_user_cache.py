@@ -0,0 +1,61 @@
+import asyncio
+import json
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from src.app.utils.cache import local as local_module
+from src.app.utils.cache import user as user_module
+from src.app.utils.cache.local import LocalCache
+from src.app.utils.cache.user import UserCache
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    r = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    async def get_redis():
+        return r
+
+    monkeypatch.setattr(user_module, "get_redis", get_redis)
+    monkeypatch.setattr(local_module, "get_redis", get_redis)
+    # Свой L1 на тест, чтобы не зависеть от соседних
+    cache = LocalCache(max_entries=100, max_bytes=1 << 20, ttl=60)
+    monkeypatch.setattr(user_module, "local_cache", cache)
+    monkeypatch.setattr(local_module, "local_cache", cache)
+    return r
+
+
+def test_patch_merges_fields_and_bumps_version(redis):
+    async def main():
+        cache = UserCache()
+        await redis.set("user:meta:1", json.dumps({"id": 1, "first_name": "A", "last_name": "B"}))
+        meta = await cache.patch(1, {"first_name": "C"})
+        return meta, json.loads(await redis.get("user:meta:1")), await redis.get("user:meta:1:v")
+
+    meta, stored, version = asyncio.run(main())
+    assert meta == {"id": 1, "first_name": "C", "last_name": "B"}
+    assert stored == meta
+    assert version == "1"
+
+
+def test_set_if_version_skips_after_concurrent_write(redis):
+    async def main():
+        cache = UserCache()
+        # Промах: версии ещё нет. Пока читали БД, кто-то сделал patch/invalidate
+        version = await redis.get("user:meta:1:v")
+        generation = user_module.local_cache.generation()
+        await cache.invalidate(1)
+        await cache._set_if_version(1, {"id": 1, "first_name": "stale"}, version, generation)
+        stale = await redis.get("user:meta:1")
+
+        version = await redis.get("user:meta:1:v")
+        generation = user_module.local_cache.generation()
+        await cache._set_if_version(1, {"id": 1, "first_name": "fresh"}, version, generation)
+        return stale, json.loads(await redis.get("user:meta:1")), user_module.local_cache.get("user:meta:1")
+
+    stale, stored, local = asyncio.run(main())
+    assert stale is None
+    assert stored == {"id": 1, "first_name": "fresh"}
+    assert local == stored